@@ -1,16 +1,185 @@
 import os
 import sqlite3
+import sys
+import time
+from datetime import datetime
+from itertools import chain, islice
+
 from dotenv import load_dotenv
 
 # 1. IMPORT YOUR API PIPELINE FUNCTION
 # Since 'api_pipeline.py' is in the same 'workflow' folder, you can import it directly:
-from api_pipeline import get_api_data
+from api_pipeline import iter_api_records
+from table_stats import StatsDelta, apply_delta, ensure_stats_table, read_stats, recount, row_hash
+
+# Stage metrics are shared with the pipelines in ../pipeline_py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline_py"))
+from stage_metrics import stage
 
 load_dotenv()
 
-def ingest_data_to_db(data_records):
-    # Ensure there is data to process
-    if not data_records:
+INGEST_CHUNKSIZE = int(os.environ.get("INGEST_CHUNKSIZE", "5000"))
+INGEST_CACHE_MB = int(os.environ.get("INGEST_CACHE_MB", "64"))
+# "merge" writes only new/changed rows (content hash); "replace" rewrites every row
+INGEST_MODE = os.environ.get("INGEST_MODE", "merge")
+# INGEST_RECORD_DELETES=1: the feed is a full snapshot, so rows missing from it get deleted_at set
+INGEST_RECORD_DELETES = os.environ.get("INGEST_RECORD_DELETES", "0") == "1"
+SQLITE_BATCH = 900  # stay under SQLite's bound-parameter limit
+
+POST_COLUMNS = ["id", "userId", "title", "body"]
+
+
+def _apply_bulk_pragmas(connection):
+    # WAL + synchronous=NORMAL: each chunk commit appends to the WAL without an fsync of the main db;
+    # a larger page cache keeps the primary-key B-tree in memory during the load
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(f"PRAGMA cache_size = -{INGEST_CACHE_MB * 1024}")
+    connection.execute("PRAGMA temp_store = MEMORY")
+
+
+def _ensure_merge_columns(cursor):
+    # tables created before merge mode existed get the bookkeeping columns added in place
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(staging_posts)")}
+    for column in ("row_hash", "deleted_at"):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE staging_posts ADD COLUMN {column} TEXT")
+
+
+def _stored_rows(cursor, ids):
+    """{id: (row_hash, deleted_at, null flags)} for the ids of one chunk that already exist."""
+    stored = {}
+    null_flags = ", ".join(f"{c} IS NULL" for c in POST_COLUMNS[1:])
+    for i in range(0, len(ids), SQLITE_BATCH):
+        batch = ids[i:i + SQLITE_BATCH]
+        for row_id, stored_hash, deleted_at, *nulls in cursor.execute(
+            f"SELECT id, row_hash, deleted_at, {null_flags} FROM staging_posts "
+            f"WHERE id IN ({', '.join('?' * len(batch))})",
+            batch,
+        ):
+            stored[row_id] = (stored_hash, deleted_at, nulls)
+    return stored
+
+
+def _track_write(delta, row, new_hash, previous):
+    # the row's old contribution leaves the statistics, the new one enters
+    if previous is not None:
+        old_hash, deleted_at, old_nulls = previous
+        if deleted_at is None:
+            delta.remove(row[0], old_hash, old_nulls)
+        else:
+            delta.deleted -= 1
+    delta.add(row[0], new_hash, [v is None for v in row[1:]])
+
+
+def _merge_chunk(cursor, rows, delta):
+    """
+    Upsert only the rows whose hash differs from the stored one (or that are new, or were
+    marked deleted). Returns (inserted, updated, unchanged); unchanged rows are never written.
+    """
+    hashed = {row[0]: (row, row_hash(row)) for row in rows}
+    stored = _stored_rows(cursor, list(hashed))
+
+    changed = []
+    inserted = updated = 0
+    for row_id, (row, new_hash) in hashed.items():
+        previous = stored.get(row_id)
+        if previous is None:
+            inserted += 1
+        elif previous[:2] != (new_hash, None):
+            updated += 1
+        else:
+            continue
+        _track_write(delta, row, new_hash, previous)
+        changed.append((*row, new_hash))
+
+    if changed:
+        cursor.executemany(
+            "INSERT INTO staging_posts (id, userId, title, body, row_hash, deleted_at) VALUES (?, ?, ?, ?, ?, NULL) "
+            "ON CONFLICT(id) DO UPDATE SET userId = excluded.userId, title = excluded.title, "
+            "body = excluded.body, row_hash = excluded.row_hash, deleted_at = NULL",
+            changed,
+        )
+    return inserted, updated, len(hashed) - inserted - updated
+
+
+def _replace_chunk(cursor, rows, delta):
+    # INSERT OR REPLACE rewrites every row; later duplicates of an id win, as REPLACE would
+    latest = {row[0]: row for row in rows}
+    stored = _stored_rows(cursor, list(latest))
+    written = []
+    for row_id, row in latest.items():
+        new_hash = row_hash(row)
+        _track_write(delta, row, new_hash, stored.get(row_id))
+        written.append((*row, new_hash))
+    cursor.executemany(
+        "INSERT OR REPLACE INTO staging_posts (id, userId, title, body, row_hash, deleted_at) "
+        "VALUES (?, ?, ?, ?, ?, NULL)",
+        written,
+    )
+    return len(written)
+
+
+def _record_deletes(cursor, delta):
+    # every live row whose id was not in this snapshot is soft-deleted (kept, stamped with deleted_at)
+    missing = "deleted_at IS NULL AND id NOT IN (SELECT id FROM temp.ingest_seen)"
+    null_flags = ", ".join(f"{c} IS NULL" for c in POST_COLUMNS[1:])
+    reader = cursor.connection.execute(f"SELECT id, row_hash, {null_flags} FROM staging_posts WHERE {missing}")
+    while True:
+        batch = reader.fetchmany(SQLITE_BATCH)
+        if not batch:
+            break
+        for row_id, stored_hash, *nulls in batch:
+            delta.remove(row_id, stored_hash, nulls)
+            delta.deleted += 1
+    reader.close()
+    cursor.execute(
+        f"UPDATE staging_posts SET deleted_at = ? WHERE {missing}",
+        (datetime.now().isoformat(timespec="seconds"),),
+    )
+    return cursor.rowcount
+
+
+def _ensure_stats(cursor):
+    # first run against an existing table: hash legacy rows, then build the statistics once
+    ensure_stats_table(cursor)
+    if read_stats(cursor, "staging_posts") is not None:
+        return
+    legacy = cursor.execute(
+        f"SELECT {', '.join(POST_COLUMNS)} FROM staging_posts WHERE row_hash IS NULL"
+    ).fetchall()
+    cursor.executemany("UPDATE staging_posts SET row_hash = ? WHERE id = ?",
+                       ((row_hash(row), row[0]) for row in legacy))
+    recount(cursor, "staging_posts", POST_COLUMNS)
+
+
+def _chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_data_to_db(data_records, chunksize=INGEST_CHUNKSIZE, mode=INGEST_MODE,
+                      record_deletes=INGEST_RECORD_DELETES):
+    """
+    Stream `data_records` (any iterable of dicts, e.g. iter_api_records()) into staging_posts,
+    committing every `chunksize` rows so memory stays flat however large the payload is.
+    mode="merge" compares a per-row content hash and only writes new or changed rows;
+    with record_deletes=True the records are treated as a full snapshot and rows missing
+    from it are stamped with deleted_at. mode="replace" rewrites every row (INSERT OR REPLACE).
+    Returns {"rows", "inserted", "updated", "unchanged", "deleted", "chunks", "seconds",
+    "rows_per_sec"}, or None when nothing was loaded.
+    """
+    if mode not in ("merge", "replace"):
+        raise ValueError(f"Unknown ingest mode: {mode}")
+
+    # Ensure there is data to process (peek one record without consuming the stream)
+    records = iter(data_records or [])
+    first = next(records, None)
+    if first is None:
         print("⚠️ No data records provided for ingestion. Skipping step.")
         return
 
@@ -18,9 +187,12 @@ def ingest_data_to_db(data_records):
     # (Included 'userId' to capture the complete JSONPlaceholder schema)
     db_name = os.environ.get("DB_NAME", "practice_warehouse.db")
     connection = None
+    stats = dict.fromkeys(("rows", "inserted", "updated", "unchanged", "deleted", "chunks"), 0)
+    start = time.perf_counter()
     
     try:
         connection = sqlite3.connect(db_name)
+        _apply_bulk_pragmas(connection)
         cursor = connection.cursor()
 
         # 2. Create target schema
@@ -29,33 +201,71 @@ def ingest_data_to_db(data_records):
                 id INTEGER PRIMARY KEY,
                 userId INTEGER,
                 title TEXT,
-                body TEXT
+                body TEXT,
+                row_hash TEXT,
+                deleted_at TEXT
             )
         """)
+        _ensure_merge_columns(cursor)
+        _ensure_stats(cursor)
+        if mode == "merge" and record_deletes:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS ingest_seen (id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM temp.ingest_seen")
+        connection.commit()
 
-        # 3. Parameterized query to prevent SQL Injection
-        insert_query = "INSERT OR REPLACE INTO staging_posts (id, userId, title, body) VALUES (?, ?, ?, ?)"
-        
-        # Parse out the dynamic dictionary keys safely using .get()
-        batch_data = [
-            (item.get('id'), item.get('userId'), item.get('title'), item.get('body')) 
-            for item in data_records
-        ]
-        # Here Writing to Permanent Storage (Disk)
-        cursor.executemany(insert_query, batch_data)
+        # 3. Parameterized queries (inside the chunk helpers) prevent SQL Injection
         
-        # 4. Commit transactions explicitly
-        # execute(): Pushes the data from Python's RAM variable into the database engine's temporary buffer.
-        connection.commit()
-        #commit(): This is the ultimate step. 
-        # It tells the operating system to safely write those records down onto your physical hard drive inside the practice_warehouse.db file.
-        # Once committed, the data is completely safe, permanent, a
-        print(f"✅ Database Ingestion Complete. {cursor.rowcount} rows merged into '{db_name}'.")
+        # the API stream is pulled inside the loop, so extract and load are one timed stage
+        with stage("api_ingest", "ingest") as ingest_stage:
+            for chunk in _chunks(chain([first], records), chunksize):
+                chunk_start = time.perf_counter()
+                # Parse out the dynamic dictionary keys safely using .get(), one chunk at a time
+                rows = [tuple(item.get(c) for c in POST_COLUMNS) for item in chunk]
+                delta = StatsDelta(POST_COLUMNS[1:])
+                if mode == "merge":
+                    inserted, updated, unchanged = _merge_chunk(cursor, rows, delta)
+                    if record_deletes:
+                        cursor.executemany("INSERT OR IGNORE INTO temp.ingest_seen (id) VALUES (?)",
+                                           ((row[0],) for row in rows))
+                    written = inserted + updated
+                    stats["inserted"] += inserted
+                    stats["updated"] += updated
+                    stats["unchanged"] += unchanged
+                else:
+                    written = _replace_chunk(cursor, rows, delta)
+                # table statistics move in the same transaction as the rows they describe
+                apply_delta(cursor, "staging_posts", delta)
+                # 4. Commit each chunk explicitly: a failure later on keeps every chunk already committed
+                connection.commit()
+                stats["chunks"] += 1
+                stats["rows"] += written
+                chunk_seconds = time.perf_counter() - chunk_start
+                print(f"   chunk {stats['chunks']}: {written} of {len(rows)} rows written "
+                      f"({len(rows) / chunk_seconds if chunk_seconds else 0:.0f} rows/sec)")
+
+            if mode == "merge" and record_deletes:
+                delta = StatsDelta(POST_COLUMNS[1:])
+                stats["deleted"] = _record_deletes(cursor, delta)
+                apply_delta(cursor, "staging_posts", delta)
+                connection.commit()
+            ingest_stage.rows = (stats["inserted"] + stats["updated"] + stats["unchanged"]
+                                 if mode == "merge" else stats["rows"])
+
+        seconds = time.perf_counter() - start
+        stats.update(seconds=round(seconds, 3), rows_per_sec=round(ingest_stage.rows / seconds) if seconds else 0)
+        if mode == "merge":
+            print(f"✅ Database Merge Complete into '{db_name}': {stats['inserted']} inserted, "
+                  f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['deleted']} deleted "
+                  f"({stats['rows_per_sec']} rows/sec).")
+        else:
+            print(f"✅ Database Ingestion Complete. {stats['rows']} rows merged into '{db_name}' "
+                  f"in {stats['chunks']} chunks ({stats['rows_per_sec']} rows/sec).")
+        return stats
 
     except Exception as db_err:
         if connection:
             connection.rollback()  
-        print(f"❌ Database transaction failed: {db_err}")
+        print(f"❌ Database transaction failed after {stats['rows']} committed rows: {db_err}")
     
     finally:
         # 5. ALWAYS close database connections to prevent leaks
@@ -71,16 +281,21 @@ if __name__ == "__main__":
     print("🚀 Starting End-to-End Workflow Pipeline...")
     
     # 📍 THIS IS WHERE THE DATA COMES IN:
-    # This line runs the function from your first script and saves the result here.
-    api_payload = get_api_data()   
-    
-    # If you want to SEE the raw data in your console before it goes to SQL, 
-    # you can add a print statement right here:
-    print("👀 Raw data fetched from API:", api_payload[:2]) # Prints just the first 2 records
+    # iter_api_records() streams records page by page instead of returning one big list.
+    api_records = iter_api_records()
+
+    # If you want to SEE the raw data in your console before it goes to SQL,
+    # peek at the first 2 records and put them back in front of the stream:
+    try:
+        preview = list(islice(api_records, 2))
+    except Exception as err:
+        print(f"❌ An unexpected error occurred: {err}")
+        preview = []
+    print("👀 Raw data fetched from API:", preview)
     
     # 📍 THIS IS WHERE THE DATA IS HANDLED:
-    # We take that 'api_payload' variable and pass it directly into your database function.
-    if api_payload:
-        ingest_data_to_db(api_payload) 
+    # The stream goes straight into the database function, one chunk at a time.
+    if preview:
+        ingest_data_to_db(chain(preview, api_records))
     else:
-        print("❌ Pipeline halted: Failed to extract data from the API.")
\ No newline at end of file
+        print("❌ Pipeline halted: Failed to extract data from the API.")
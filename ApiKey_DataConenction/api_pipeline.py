@@ -1,35 +1,184 @@
+import codecs
+import json
 import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # 1. loading credentials securely from a .env file
 # Never hardcode keys in code that goes to GitHub!
 load_dotenv()
 
-def get_api_data():
+API_URL = "https://jsonplaceholder.typicode.com/posts"
+API_WORKERS = int(os.environ.get("API_WORKERS", "8"))
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", "100"))
+API_MAX_RETRIES = int(os.environ.get("API_MAX_RETRIES", "5"))
+API_STREAM_BYTES = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=API_WORKERS):
+    """
+    One pooled keep-alive Session for every request in this process.
+    429/5xx responses are retried with exponential backoff, honouring Retry-After.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=API_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+                respect_retry_after_header=True,
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def _auth_headers():
     #  fetch this via os.environ.get("MY_API_KEY")
-    api_url = "https://jsonplaceholder.typicode.com/posts"
     mock_token = os.environ.get("mock_token")
 
     # 2.  building standard authorization headers
-    headers = {
+    return {
         "Authorization": f"Bearer {mock_token}",
         "Content-Type": "application/json"
     }
 
-    try:
-        # 3. Executing the Web Call with a Network Timeout :sending the request with a timeout
-        # If the web server threw an error (like 404 Not Found or 500 Internal Server Error), 
-        # this line immediately halts the script and throws an exception rather than passing corrupted or empty data down the line.
-        response = requests.get(api_url, headers=headers, timeout=10)
-        
-        # 4. The Validation Gatekeeper :robust error handling (raises an HTTPError if status is 4xx or 5xx)
+
+def _get_json(url, params=None, timeout=10):
+    # 3. Executing the Web Call with a Network Timeout; retries/backoff happen inside the session
+    response = get_session().get(url, headers=_auth_headers(), params=params, timeout=timeout)
+    # 4. The Validation Gatekeeper :robust error handling (raises an HTTPError if status is 4xx or 5xx)
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_json_array(byte_chunks):
+    """
+    Incrementally parse a top-level JSON array from an iterable of byte chunks,
+    yielding one element at a time so the full payload is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, started = "", 0, False
+    for chunk in byte_chunks:
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+                pos += 1
+            if pos == len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array payload")
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if end == len(buf):
+                break  # a number at the buffer edge may still be growing
+            yield item
+            pos = end
+    raise ValueError("Truncated JSON array payload")
+
+
+def _stream_json(url, params=None, timeout=10):
+    # single response parsed as it downloads instead of response.json() on the whole body
+    with get_session().get(url, headers=_auth_headers(), params=params, timeout=timeout, stream=True) as response:
         response.raise_for_status()
-        
+        yield from iter_json_array(response.iter_content(API_STREAM_BYTES))
+
+
+def _records(payload, records_key):
+    if records_key and isinstance(payload, dict):
+        return payload.get(records_key) or []
+    return payload or []
+
+
+def _iter_numbered_pages(url, params_for, page_size, records_key, workers, max_pages):
+    """
+    Fetch numbered pages (page or offset) concurrently, at most `workers` in flight,
+    and yield records in page order. Stops at the first short or empty page.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        next_page = 0
+        while True:
+            while len(in_flight) < workers and (max_pages is None or next_page < max_pages):
+                in_flight.append(pool.submit(_get_json, url, params_for(next_page)))
+                next_page += 1
+            if not in_flight:
+                return
+            records = _records(in_flight.popleft().result(), records_key)
+            yield from records
+            if len(records) < page_size:
+                # last page: drop requests already sent for pages past the end
+                for future in in_flight:
+                    future.cancel()
+                return
+
+
+def iter_api_records(url=API_URL, pagination="page", page_size=API_PAGE_SIZE, workers=API_WORKERS,
+                     max_pages=None, params=None, records_key=None,
+                     page_param="_page", size_param="_limit", offset_param="_start",
+                     cursor_param="cursor", next_cursor_key="next_cursor"):
+    """
+    Stream records from a paginated endpoint over the pooled session.
+      pagination="page"   -> ?_page=1,2,... &_limit=page_size   (fetched concurrently)
+      pagination="offset" -> ?_start=0,100,... &_limit=page_size (fetched concurrently)
+      pagination="cursor" -> follows payload[next_cursor_key] until it is empty (sequential)
+      pagination=None     -> a single request (a bare JSON array is parsed incrementally)
+    `records_key` names the list inside a dict payload (e.g. "data"); a bare list is used as is.
+    """
+    base = dict(params or {})
+    if pagination is None and records_key is None:
+        yield from _stream_json(url, base)
+    elif pagination is None:
+        yield from _records(_get_json(url, base), records_key)
+    elif pagination == "page":
+        yield from _iter_numbered_pages(
+            url, lambda n: {**base, page_param: n + 1, size_param: page_size},
+            page_size, records_key, workers, max_pages)
+    elif pagination == "offset":
+        yield from _iter_numbered_pages(
+            url, lambda n: {**base, offset_param: n * page_size, size_param: page_size},
+            page_size, records_key, workers, max_pages)
+    elif pagination == "cursor":
+        cursor, pages = None, 0
+        while max_pages is None or pages < max_pages:
+            payload = _get_json(url, {**base, size_param: page_size, **({cursor_param: cursor} if cursor else {})})
+            yield from _records(payload, records_key)
+            pages += 1
+            cursor = payload.get(next_cursor_key) if isinstance(payload, dict) else None
+            if not cursor:
+                return
+    else:
+        raise ValueError(f"Unknown pagination mode: {pagination}")
+
+
+def get_api_data(api_url=API_URL, **extractor_options):
+    """Collect iter_api_records() into a list (kept for callers that need the whole payload)."""
+    try:
         # Parse the JSON response:Turning Raw Payload into Python Data
-        # Parse the response content as JSON and assign it to the variable 'data'
         #the data is stored in your computer's temporary volatile memory (RAM), specifically inside a Python variable named data.
-        data = response.json()
+        data = list(iter_api_records(api_url, **extractor_options))
        
  
         print(f"✅ Success! Successfully retrieved {len(data)} records.")
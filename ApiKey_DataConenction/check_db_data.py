@@ -1,10 +1,30 @@
+import argparse
 import os
 import sqlite3
 from dotenv import load_dotenv
 
+from table_stats import read_stats, recount
+
 load_dotenv()
 
-def verify_warehouse_data():
+POST_COLUMNS = ["id", "userId", "title", "body"]
+STAT_FIELDS = ["row_count", "deleted_count", "min_id", "max_id", "null_counts", "checksum"]
+
+
+def _print_stats(stats):
+    print(f"📊 Total records successfully logged in table: {stats['row_count']} "
+          f"({stats['deleted_count']} soft-deleted)")
+    print(f"   id range: {stats['min_id']} .. {stats['max_id']} | nulls: {stats['null_counts']}")
+    print(f"   checksum: {stats['checksum']:016x} | last load: {stats['last_load_at']} "
+          f"| last recount: {stats['last_recount_at']}")
+
+
+def verify_warehouse_data(full_recount=False):
+    """
+    Show a sample and the statistics the ingest path keeps in table_stats (constant time).
+    full_recount=True also scans the whole table, compares the result with the stored
+    statistics and saves the recount. Returns True when nothing disagreed.
+    """
     # 1. Point to the same database file
     db_name = os.environ.get("DB_NAME", "practice_warehouse.db")
     connection = None
@@ -33,20 +53,41 @@ def verify_warehouse_data():
             print(f"Post ID: {row[0]} | User ID: {row[1]} | Title: {row[2][:40]}...")
         print("-" * 60)
 
-        # 5. Get a quick total row count for data validation/auditing
-        cursor.execute("SELECT COUNT(*) FROM staging_posts;")
-        total_count = cursor.fetchone()[0] # fetchone() returns a 1-item tuple like (100,)
-        print(f"📊 Total records successfully logged in table: {total_count}")
+        # 5. Read the ingest-time statistics instead of scanning with COUNT(*)
+        stats = read_stats(cursor, "staging_posts")
+        if stats is None:
+            print("⚠️ No table statistics yet. Re-run 'Python to SQL.py' or pass --recount.")
+            full_recount = True
+        else:
+            _print_stats(stats)
+
+        if not full_recount:
+            return True
+
+        # 6. On demand: full scan, compared field by field with the stored statistics
+        print("🔁 Recounting staging_posts with a full scan...")
+        fresh = recount(cursor, "staging_posts", POST_COLUMNS)
+        connection.commit()
+        mismatches = [f for f in STAT_FIELDS if stats is not None and stats[f] != fresh[f]]
+        for field in mismatches:
+            print(f"❌ {field}: stored {stats[field]} != recount {fresh[field]}")
+        if stats is not None and not mismatches:
+            print("✅ Stored statistics match a full recount.")
+        _print_stats(read_stats(cursor, "staging_posts"))
+        return not mismatches
 
     except Exception as err:
         print(f"❌ Failed to read data from database: {err}")
         
     finally:
-        # 6. Always clean up connections
+        # 7. Always clean up connections
         if connection:
             cursor.close()
             connection.close()
             print("\n🔌 Database verification connection closed.")
 
 if __name__ == "__main__":
-    verify_warehouse_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Verify staging_posts from its ingest-time statistics.")
+    parser.add_argument("--recount", action="store_true", help="also run a full recount and compare")
+    args = parser.parse_args()
+    verify_warehouse_data(full_recount=args.recount)
\ No newline at end of file
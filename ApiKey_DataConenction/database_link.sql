@@ -1,5 +1,5 @@
 -- ==============================================================================
- Database-to-Database Linking (Pure SQL)
+-- Database-to-Database Linking (Pure SQL)
 -- Goal: Query and join data across two completely separate database architectures
 -- ==============================================================================
 
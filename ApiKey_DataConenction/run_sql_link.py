@@ -1,55 +1,148 @@
 import os
 import sqlite3
+import time
 
-def run_pure_sql_scenario():
+# Rows pulled per fetchmany() round trip; result sets are streamed, never fetched whole
+SQL_FETCH_SIZE = int(os.environ.get("SQL_FETCH_SIZE", "1000"))
+# Prepared statements kept per connection (sqlite3 reuses them for repeated SQL text)
+SQL_STATEMENT_CACHE = int(os.environ.get("SQL_STATEMENT_CACHE", "128"))
+# Statements that have no query plan worth asking for
+_NO_PLAN = ("ATTACH", "DETACH", "PRAGMA", "BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def iter_statements(sql_script):
+    """
+    Split a script into complete statements using sqlite3.complete_statement, so semicolons
+    inside strings, quoted identifiers or comments never cut a statement in half.
+    Comment-only text is dropped; comments in front of a statement stay attached to it.
+    """
+    buffer_start = 0
+    position = sql_script.find(";")
+    while position != -1:
+        candidate = sql_script[buffer_start:position + 1]
+        if sqlite3.complete_statement(candidate):
+            yield candidate.strip()
+            buffer_start = position + 1
+        position = sql_script.find(";", position + 1)
+    tail = sql_script[buffer_start:].strip()
+    # a last statement without its closing semicolon still runs
+    if tail and sqlite3.complete_statement(tail + ";") and _strip_comments(tail):
+        yield tail
+
+
+def _strip_comments(statement):
+    """Statement text without leading -- and /* */ comments (used to classify it)."""
+    text = statement.lstrip()
+    while text.startswith("--") or text.startswith("/*"):
+        end = text.find("\n") if text.startswith("--") else text.find("*/") + 1
+        if end <= 0:
+            return ""
+        text = text[end + 1:].lstrip()
+    return text
+
+
+def _query_plan(cursor, statement):
+    """EXPLAIN QUERY PLAN rendered as an indented tree, or None when SQLite has no plan for it."""
+    keyword = _strip_comments(statement).split(None, 1)[0].upper()
+    if keyword in _NO_PLAN:
+        return None
+    try:
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    except sqlite3.Error:
+        return None
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("   " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+
+def run_sql_script(conn, sql_script, fetch_size=SQL_FETCH_SIZE, explain=True):
+    """
+    Execute every statement in `sql_script` on `conn`, streaming result sets in `fetch_size`
+    batches. Returns one profile dict per statement:
+    {"statement", "status", "seconds", "rows", "plan", "error"}.
+    """
+    cursor = conn.cursor()
+    profile = []
+    for statement in iter_statements(sql_script):
+        if not _strip_comments(statement):
+            continue
+        entry = {"statement": _strip_comments(statement), "status": "ok", "seconds": 0.0,
+                 "rows": 0, "plan": _query_plan(cursor, statement) if explain else None, "error": None}
+        start = time.perf_counter()
+        try:
+            cursor.execute(statement)
+
+            # A statement with a cursor description produces a result set: stream it batch by batch
+            if cursor.description is not None:
+                columns = [c[0] for c in cursor.description]
+                print("\n🎯 Cross-Database Joined Results Found:")
+                print("-" * 80)
+                while True:
+                    batch = cursor.fetchmany(fetch_size)
+                    if not batch:
+                        break
+                    entry["rows"] += len(batch)
+                    for row in batch:
+                        print(" | ".join(f"{name}: {value}" for name, value in zip(columns, row)))
+                print("-" * 80)
+            else:
+                entry["rows"] = max(cursor.rowcount, 0)
+
+        except sqlite3.Error as sql_err:
+            entry.update(status="failed", error=str(sql_err))
+            print(f"❌ Failed executing block:\n{statement}\nReason: {sql_err}")
+        entry["seconds"] = time.perf_counter() - start
+        profile.append(entry)
+    cursor.close()
+    return profile
+
+
+def print_profile(profile):
+    print("\n⏱️ Per-statement profile:")
+    print("-" * 80)
+    for i, entry in enumerate(profile, 1):
+        label = " ".join(entry["statement"].split())[:50]
+        print(f"{i:>3}. {entry['status']:<7}{entry['seconds'] * 1000:>10.2f} ms{entry['rows']:>9} rows  {label}")
+        if entry["plan"]:
+            for line in entry["plan"].splitlines():
+                print(f"{'':>8}QUERY PLAN  {line}")
+    print("-" * 80)
+    print(f"{'':>5}total  {sum(e['seconds'] for e in profile) * 1000:>10.2f} ms")
+
+
+def run_pure_sql_scenario(db_path=None, sql_path=None, fetch_size=SQL_FETCH_SIZE):
     # Ensure we run relative to this script's location so files find each other
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(script_dir, "../practice_warehouse.db")
-    sql_path = os.path.join(script_dir, "database_link.sql")
-    
+    db_path = db_path or os.path.join(script_dir, "../practice_warehouse.db")
+    sql_path = sql_path or os.path.join(script_dir, "database_link.sql")
+
     # 1. Connect to your primary practice database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    # isolation_level=None runs the script statement by statement, like the sqlite3 shell,
+    # so ATTACH/DETACH never land inside an implicit transaction
+    conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=SQL_STATEMENT_CACHE)
+
     # 2. Read the pure SQL script you just wrote
     with open(sql_path, "r") as sql_file:
         sql_script = sql_file.read()
-    
+
     print("🚀 Executing Cross-Database Link Queries from database_link.sql...")
-    
-    # 3. Split by semicolon to isolate individual commands
-    sql_commands = sql_script.split(';')
-    for command in sql_commands:
-        clean_command = command.strip()
-        
-        # 🛠️ FIXED: Skip empty strings or blocks that are just standalone SQL comments
-        if not clean_command or clean_command.startswith("--"):
-            continue
-            
-        try:
-            cursor.execute(clean_command)
-            
-            # If the command is our golden SELECT query, grab and print the output records!
-            if "SELECT" in clean_command:
-                results = cursor.fetchall()
-                print("\n🎯 Cross-Database Joined Results Found:")
-                print("-" * 80)
-                for row in results:
-                    print(f"Post ID: {row[0]} | Product: {row[2]} | Stock: {row[3]}")
-                print("-" * 80)
-                
-        except sqlite3.OperationalError as sql_err:
-            print(f"❌ Failed executing block:\n{clean_command}\nReason: {sql_err}")
-    
+
+    # 3. Execute statement by statement with timing and query plans
+    profile = run_sql_script(conn, sql_script, fetch_size)
+    print_profile(profile)
+
     # 4. Clean up the link connection safely
     try:
-        cursor.execute("DETACH DATABASE RemoteInventoryDB;")
+        conn.execute("DETACH DATABASE RemoteInventoryDB;")
     except sqlite3.OperationalError:
         pass  # If it wasn't attached, ignore the error on close
-        
-    cursor.close()
+
     conn.close()
     print("✅ Scenario run complete. Connection links detached cleanly.")
+    return profile
 
 if __name__ == "__main__":
-    run_pure_sql_scenario()
\ No newline at end of file
+    run_pure_sql_scenario()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+from datetime import datetime
+
+# One row per table, maintained by the ingest path inside the same transaction as each batch,
+# so verification reads counts / id range / nulls / checksum without scanning the table.
+#   row_count      live rows (deleted_at IS NULL)
+#   deleted_count  soft-deleted rows
+#   min_id/max_id  over every stored id (ingest never hard-deletes)
+#   null_counts    JSON {column: nulls among live rows}
+#   checksum       order-independent: sum of per-row checksums of live rows, mod 2**63
+STATS_TABLE = "table_stats"
+CHECKSUM_MOD = 2 ** 63
+RECOUNT_FETCH_SIZE = 5000
+
+
+def row_hash(row):
+    """Content hash of every non-key column of `row` (id first); a changed value changes the hash."""
+    return hashlib.blake2b(json.dumps(row[1:], ensure_ascii=False).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def row_checksum(row_id, content_hash):
+    # summing these is independent of row order, and any changed id or value moves the total
+    digest = hashlib.blake2b(f"{row_id}:{content_hash}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % CHECKSUM_MOD
+
+
+def ensure_stats_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER,
+            deleted_count INTEGER,
+            min_id INTEGER,
+            max_id INTEGER,
+            null_counts TEXT,
+            checksum INTEGER,
+            last_load_at TEXT,
+            last_recount_at TEXT
+        )
+    """)
+
+
+def read_stats(cursor, table):
+    """The stored statistics row for `table` as a dict, or None if it was never computed."""
+    try:
+        cursor.execute(f"SELECT * FROM {STATS_TABLE} WHERE table_name = ?", (table,))
+    except Exception:
+        return None  # no stats table yet
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    stats = dict(zip([c[0] for c in cursor.description], row))
+    stats["null_counts"] = json.loads(stats["null_counts"] or "{}")
+    return stats
+
+
+class StatsDelta:
+    """Change to one table's statistics accumulated over a batch, applied with apply_delta()."""
+
+    def __init__(self, columns):
+        self.rows = 0
+        self.deleted = 0
+        self.nulls = dict.fromkeys(columns, 0)
+        self.checksum = 0
+        self.min_id = None
+        self.max_id = None
+
+    def add(self, row_id, content_hash, nulls):
+        self.rows += 1
+        self.checksum += row_checksum(row_id, content_hash)
+        for column, is_null in zip(self.nulls, nulls):
+            self.nulls[column] += int(bool(is_null))
+        self.min_id = row_id if self.min_id is None else min(self.min_id, row_id)
+        self.max_id = row_id if self.max_id is None else max(self.max_id, row_id)
+
+    def remove(self, row_id, content_hash, nulls):
+        self.rows -= 1
+        self.checksum -= row_checksum(row_id, content_hash)
+        for column, is_null in zip(self.nulls, nulls):
+            self.nulls[column] -= int(bool(is_null))
+
+
+def apply_delta(cursor, table, delta, loaded=True):
+    """Fold `delta` into the stored row for `table` (call inside the batch's transaction)."""
+    stats = read_stats(cursor, table) or {
+        "row_count": 0, "deleted_count": 0, "min_id": None, "max_id": None,
+        "null_counts": {}, "checksum": 0, "last_load_at": None, "last_recount_at": None,
+    }
+    nulls = {c: stats["null_counts"].get(c, 0) + n for c, n in delta.nulls.items()}
+    ids = [i for i in (stats["min_id"], stats["max_id"], delta.min_id, delta.max_id) if i is not None]
+    _write_stats(cursor, table, {
+        **stats,
+        "row_count": stats["row_count"] + delta.rows,
+        "deleted_count": stats["deleted_count"] + delta.deleted,
+        "min_id": min(ids) if ids else None,
+        "max_id": max(ids) if ids else None,
+        "null_counts": nulls,
+        "checksum": (stats["checksum"] + delta.checksum) % CHECKSUM_MOD,
+        "last_load_at": datetime.now().isoformat(timespec="seconds") if loaded else stats["last_load_at"],
+    })
+
+
+def recount(cursor, table, columns, save=True):
+    """
+    Full scan of `table` (streamed with fetchmany) computing the same statistics from the
+    stored rows. `columns` is [id, *value columns]; the table also has row_hash / deleted_at.
+    With save=True the stored row is replaced.
+    """
+    delta = StatsDelta(columns[1:])
+    deleted = 0
+    cursor.execute(f"SELECT {', '.join(columns)}, row_hash, deleted_at FROM {table}")
+    while True:
+        batch = cursor.fetchmany(RECOUNT_FETCH_SIZE)
+        if not batch:
+            break
+        for *row, stored_hash, deleted_at in batch:
+            if deleted_at is None:
+                delta.add(row[0], stored_hash or row_hash(row), [v is None for v in row[1:]])
+            else:
+                deleted += 1
+                delta.min_id = row[0] if delta.min_id is None else min(delta.min_id, row[0])
+                delta.max_id = row[0] if delta.max_id is None else max(delta.max_id, row[0])
+
+    previous = read_stats(cursor, table) or {}
+    stats = {
+        "row_count": delta.rows,
+        "deleted_count": deleted,
+        "min_id": delta.min_id,
+        "max_id": delta.max_id,
+        "null_counts": delta.nulls,
+        "checksum": delta.checksum % CHECKSUM_MOD,
+        "last_load_at": previous.get("last_load_at"),
+        "last_recount_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    if save:
+        _write_stats(cursor, table, stats)
+    return stats
+
+
+def _write_stats(cursor, table, stats):
+    cursor.execute(
+        f"INSERT OR REPLACE INTO {STATS_TABLE} (table_name, row_count, deleted_count, min_id, max_id, "
+        f"null_counts, checksum, last_load_at, last_recount_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (table, stats["row_count"], stats["deleted_count"], stats["min_id"], stats["max_id"],
+         json.dumps(stats["null_counts"]), stats["checksum"], stats["last_load_at"], stats["last_recount_at"]),
+    )
@@ -1,56 +1,226 @@
 # identify duplicate records by payment_id, you can use the Pandas .duplicated() method. 
 #This is a very efficient way to flag data quality issues in a data & analytics workflow.
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from audit_sketch import APPROX_THRESHOLD, estimate_duplicates, format_estimate
+from db_engine import DB_MAX_OVERFLOW, DB_POOL_SIZE, dispose_all, get_engine, mysql_dsn
+from SLACK import flush_notifications, send_slack_notification
+from stage_metrics import stage
+from typed_reader import SCHEMAS, coerce, read_typed, unscale
+
+# Batch mode (--batch): table -> key sets checked every night. Each key set is one check;
+# the first column of a set is the id column. DUP_AUDIT_CONFIG points to a JSON file
+# {"checks": [...]} in the same format to replace these.
+DUP_AUDIT_CHECKS = [
+    {"table": "payment", "keys": [["payment_id"], ["customer_id", "rental_id", "payment_date"]]},
+    {"table": "rental", "keys": [["rental_id"], ["rental_date", "inventory_id", "customer_id"]]},
+    {"table": "inventory", "keys": [["inventory_id"]]},
+    {"table": "customer", "keys": [["customer_id"], ["email"]]},
+]
+DUP_AUDIT_CONFIG = os.getenv("DUP_AUDIT_CONFIG", "")
+DUP_AUDIT_WORKERS = int(os.getenv("DUP_AUDIT_WORKERS", "4"))
 
 def get_db_connection(user, password, host, port, database):
-    conn_str = f"mysql+pymysql://{user}:{password}@{host}:{port}/{database}"
-    # The following line initializes and returns an SQLAlchemy Engine, which serves as the primary interface
-    # for connecting to and working with a SQL database (in this case, a MySQL database using pymysql).
+    conn_str = mysql_dsn(database, user, password, host, port)
+    # The following line returns the shared, pooled SQLAlchemy Engine for this connection string, which serves
+    # as the primary interface for connecting to and working with a SQL database (in this case, MySQL via pymysql).
     # The `conn_str` includes the username, password, host, port, and database name, allowing SQLAlchemy
     # to know how to establish the database connection.
-    return create_engine(conn_str)
+    return get_engine(conn_str)
+
+def _report_duplicates(wrong_records, table, id_column):
+    # Check if the DataFrame 'wrong_records' is not empty,
+    # meaning duplicate records have been detected in the data.
+    if not wrong_records.empty:
+        num_errors = len(wrong_records)
+        # Calculate how many unique IDs are affected by duplicates:
+        # 'nunique()' counts distinct values in the specified column of the DataFrame.
+        unique_ids = wrong_records[id_column].nunique()
+
+        print(f"⚠️ ERROR: Found {num_errors} duplicate records affecting {unique_ids} unique {id_column}s!")
+        print("-" * 30)
+        print(wrong_records.head(20))  # Show only up to 20 records for clarity
+        print("-" * 30)
+    else:
+        print(f"✅ No duplicate {id_column} found in {table}.")
+
+
+def _pushdown_duplicates(engine, table, keys, id_column):
+    """
+    Let the database find the duplicate keys (GROUP BY ... HAVING COUNT(*) > 1)
+    and only transfer the full rows that belong to those keys.
+    GROUP BY puts NULL keys in one group (as pandas .duplicated() does), so the rows are matched
+    back with null-safe equality; a plain IN (...) would never match a key containing NULL.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    q_table = quote(table)
+    key_list = ", ".join(quote(k) for k in keys)
+    null_safe = {"mysql": "<=>", "sqlite": "IS"}.get(engine.dialect.name, "IS NOT DISTINCT FROM")
+    on = " AND ".join(f"t.{quote(k)} {null_safe} d.{quote(k)}" for k in keys)
+    query = (
+        f"SELECT t.* FROM {q_table} t "
+        f"JOIN (SELECT {key_list} FROM {q_table} GROUP BY {key_list} HAVING COUNT(*) > 1) d ON {on} "
+        f"ORDER BY t.{quote(id_column)}"
+    )
+    return coerce(pd.read_sql(text(query), engine), SCHEMAS.get(table, {}))
+
+
+def _pandas_duplicates(engine, table, keys, id_column):
+    # Fallback for backends that cannot run the push-down query: only the first 10k rows are checked.
+    df = read_typed(engine, table, limit=10000)
+    # multi_duplicate_mask = df.duplicated(subset=['payment_id', 'amount'], keep=False)
+    # Identifying 100% identical clones
+    # Since subset is NOT used, it checks every column automatically
+    duplicate_mask = df.duplicated(subset=keys, keep=False)
+
+    #duplicate_clones = df[df.duplicated(keep=False)]
+
+    return df[duplicate_mask].sort_values(by=id_column)
 
-def run_duplicate_check(engine, table, id_column):
+
+def find_duplicates(engine, table, keys, approximate=False, threshold=APPROX_THRESHOLD, log=print):
+    """
+    Core of the duplicate check: rows of `table` whose `keys` repeat (the first key is the id column),
+    or an empty frame when the approximate pre-check rules them out. Progress goes to `log`;
+    raises ValueError when a key column does not exist.
+    """
+    id_column = keys[0]
+    columns = {col["name"] for col in inspect(engine).get_columns(table)}
+    missing = [k for k in keys if k not in columns]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} does not exist in table {table}.")
+
+    if approximate:
+        est = estimate_duplicates(engine, table, keys)
+        log(f"📈 Approximate check: {format_estimate(est)}")
+        if est["duplicate_rate"] <= threshold:
+            log(f"✅ Estimated duplicate rate is within {threshold:.4%}; exact check skipped.")
+            return est["examples"].iloc[0:0]
+        log(f"⚠️ Estimated duplicate rate is above {threshold:.4%}; running the exact check.")
+
+    try:
+        wrong_records = _pushdown_duplicates(engine, table, keys, id_column)
+    except DBAPIError as pushdown_err:
+        log(f"⚠️ Push-down check not supported by this backend ({pushdown_err.orig}); "
+            f"falling back to a pandas check of the first 10000 rows.")
+        wrong_records = _pandas_duplicates(engine, table, keys, id_column)
+
+    # declared decimal columns come back as scaled ints; show them as decimals
+    return unscale(wrong_records, SCHEMAS.get(table, {}))
+
+
+def run_duplicate_check(engine, table, id_column, subset=None, approximate=False, threshold=APPROX_THRESHOLD):
+    """
+    Find rows whose `id_column` (plus the optional composite `subset` columns) repeats in `table`.
+    The whole table is checked inside the database; the pandas sample check is only used
+    when the backend rejects the push-down query. Returns the duplicate rows.
+    With approximate=True the keys are sketched first and the exact check only runs
+    when the estimated duplicate rate is above `threshold`.
+    """
     print("🔎 Starting Duplicate Check...")
+    keys = [id_column] + [c for c in (subset or []) if c != id_column]
 
     try:
-        # Read data
-        df = pd.read_sql(f"SELECT * FROM {table} LIMIT 10000", engine)
-
-        if id_column not in df.columns:
-            print(f"❌ ERROR: {id_column} does not exist in table {table}.")
-            return
-        # multi_duplicate_mask = df.duplicated(subset=['payment_id', 'amount'], keep=False)
-        # Identifying 100% identical clones
-        # Since subset is NOT used, it checks every column automatically
-        duplicate_mask = df.duplicated(subset=[id_column], keep=False)
-      
-        #duplicate_clones = df[df.duplicated(keep=False)]
-
-        wrong_records = df[duplicate_mask].sort_values(by=id_column)
-        
-        # Check if the DataFrame 'wrong_records' is not empty,
-        # meaning duplicate records have been detected in the data.
-        if not wrong_records.empty:
-            num_errors = len(wrong_records)
-            # Calculate how many unique IDs are affected by duplicates:
-            # 'nunique()' counts distinct values in the specified column of the DataFrame.
-            unique_ids = wrong_records[id_column].nunique()
-            
-            print(f"⚠️ ERROR: Found {num_errors} duplicate records affecting {unique_ids} unique {id_column}s!")
-            print("-" * 30)
-            print(wrong_records.head(20))  # Show only up to 20 records for clarity
-            print("-" * 30)
-        else:
-            print(f"✅ No duplicate {id_column} found in {table}.")
+        wrong_records = find_duplicates(engine, table, keys, approximate, threshold)
+        _report_duplicates(wrong_records, table, id_column)
+        return wrong_records
+    except ValueError as e:
+        print(f"❌ ERROR: {e}")
     except Exception as e:
         # This line catches any exceptions raised in the try block above and prints a user-friendly error message,
         # including the details of the exception (e.g., connection issues, SQL errors, etc.). The "❌" symbol is 
         # used to visually highlight the error in the console output, making it easy for a user to spot what went wrong.
         print(f"❌ Error: {e}")
 
-def main():
+
+# BATCH MODE
+# Every (table, key set) pair is an independent check, run concurrently on a bounded thread pool
+# over the shared pooled engine, so the nightly audit takes about as long as the slowest check.
+def load_batch_config(path=None):
+    """Checks from the JSON file at `path` (format of DUP_AUDIT_CHECKS), or the built-in defaults."""
+    path = path or DUP_AUDIT_CONFIG
+    if not path:
+        return DUP_AUDIT_CHECKS
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["checks"]
+
+
+def _batch_jobs(checks):
+    for check in checks:
+        for keys in check["keys"]:
+            keys = [keys] if isinstance(keys, str) else list(keys)
+            yield check["table"], keys, check.get("approximate", False)
+
+
+def _timed_check(engine, table, keys, approximate, threshold):
+    label = f"{table}({', '.join(keys)})"
+    start = time.perf_counter()
+    try:
+        with stage("duplicate_check", label) as s:
+            found = find_duplicates(engine, table, keys, approximate, threshold,
+                                    log=lambda msg: print(f"[{label}] {msg}"))
+            s.rows = len(found)
+        affected = found[keys].drop_duplicates().shape[0] if not found.empty else 0
+        return {"table": table, "keys": keys, "status": "success", "duplicates": len(found),
+                "affected_keys": affected, "seconds": time.perf_counter() - start, "error": None}
+    except Exception as e:
+        return {"table": table, "keys": keys, "status": "failed", "duplicates": None,
+                "affected_keys": None, "seconds": time.perf_counter() - start, "error": e}
+
+
+def format_batch_report(results, wall_seconds):
+    """Consolidated plain-text report: one line per check, then the wall time vs. the summed check time."""
+    lines = [f"{'table':<14}{'keys':<44}{'status':<9}{'dups':>8}{'keys hit':>10}{'seconds':>9}"]
+    for r in results:
+        dups = "-" if r["duplicates"] is None else r["duplicates"]
+        hit = "-" if r["affected_keys"] is None else r["affected_keys"]
+        lines.append(f"{r['table']:<14}{', '.join(r['keys']):<44}{r['status']:<9}{dups:>8}{hit:>10}{r['seconds']:>9.2f}")
+        if r["error"] is not None:
+            lines.append(f"    ❌ {type(r['error']).__name__}: {r['error']}")
+    lines.append(f"wall time {wall_seconds:.2f}s for {sum(r['seconds'] for r in results):.2f}s of checks")
+    return "\n".join(lines)
+
+
+def run_batch_checks(engine, checks=None, workers=None, threshold=APPROX_THRESHOLD, notify=False):
+    """
+    Run every (table, key set) in `checks` (default: load_batch_config()) concurrently and print one
+    consolidated report. Returns the per-check results in config order. With notify=True the
+    checks that found duplicates or failed are sent to Slack as a single message.
+    """
+    checks = load_batch_config() if checks is None else checks
+    jobs = list(_batch_jobs(checks))
+    workers = max(1, workers or DUP_AUDIT_WORKERS)
+    if engine.dialect.name != "sqlite":
+        # more threads than pooled connections would just queue on the pool
+        workers = min(workers, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    print(f"🔎 Running {len(jobs)} duplicate checks on {min(workers, len(jobs))} workers...")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dup-check") as pool:
+        futures = [pool.submit(_timed_check, engine, table, keys, approximate, threshold)
+                   for table, keys, approximate in jobs]
+        results = [f.result() for f in futures]
+    report = format_batch_report(results, time.perf_counter() - start)
+
+    print("-" * 94)
+    print(report)
+    print("-" * 94)
+
+    issues = [r for r in results if r["status"] == "failed" or r["duplicates"]]
+    if notify and issues:
+        send_slack_notification("*Nightly duplicate audit found issues:*\n```" + report + "```")
+    return results
+
+
+def _interactive():
     print("Welcome to the Duplicate Record Checker!")
     user = input("Enter MySQL username: ")
     password = input("Enter MySQL password: ")
@@ -59,9 +229,35 @@ def main():
     database = input("Enter database name: ")
     table = input("Enter table name: ")
     id_column = input("Enter the column name to check for duplicates (e.g. payment_id): ")
+    extra = input("Extra columns for a composite key, comma separated [default: none]: ")
+    subset = [c.strip() for c in extra.split(",") if c.strip()]
+    mode = input("Check mode, exact or approximate [default: exact]: ").strip().lower() or "exact"
     
     engine = get_db_connection(user, password, host, port, database)
-    run_duplicate_check(engine, table, id_column)
+    run_duplicate_check(engine, table, id_column, subset, approximate=(mode == "approximate"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check tables for duplicate keys.")
+    parser.add_argument("--batch", action="store_true",
+                        help="non-interactive: run every check of the batch config concurrently")
+    parser.add_argument("--config", default=DUP_AUDIT_CONFIG, help="JSON batch config (default: built-in sakila checks)")
+    parser.add_argument("--database", help="database for the batch checks (default: DB_NAME from .env)")
+    parser.add_argument("--workers", type=int, default=DUP_AUDIT_WORKERS, help="max checks running at once")
+    parser.add_argument("--notify", action="store_true", help="send the report to Slack when issues are found")
+    args = parser.parse_args()
+
+    if not args.batch:
+        _interactive()
+        return
+    try:
+        results = run_batch_checks(get_engine(mysql_dsn(args.database)), load_batch_config(args.config),
+                                   args.workers, notify=args.notify)
+    finally:
+        dispose_all()
+        flush_notifications()
+    # a check that could not run fails the job; duplicates themselves are findings, not errors
+    sys.exit(1 if any(r["status"] == "failed" for r in results) else 0)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,47 +1,171 @@
 # SLACK.py (tiny hardening patch)
+# Pipelines call send_slack_notification() inline. With SLACK_ASYNC=1 (default) the call only
+# enqueues the message: a background thread coalesces everything that arrives within
+# SLACK_COALESCE_SECONDS into one post over a pooled keep-alive session, honours 429
+# Retry-After, and flushes on interpreter exit, so a slow Slack never delays a pipeline.
 from dotenv import load_dotenv, find_dotenv
+import atexit
 import os
+import threading
+import time
+from collections import deque
+
 import requests
+from requests.adapters import HTTPAdapter
 
 load_dotenv(find_dotenv())
 SLACK_TOKEN = os.getenv("SLACK_TOKEN")
 SLACK_CHANNEL = "#audit-alerts"
+SLACK_URL = "https://slack.com/api/chat.postMessage"
+
+SLACK_ASYNC = os.getenv("SLACK_ASYNC", "1") == "1"
+SLACK_COALESCE_SECONDS = float(os.getenv("SLACK_COALESCE_SECONDS", "2"))
+SLACK_FLUSH_TIMEOUT = float(os.getenv("SLACK_FLUSH_TIMEOUT", "30"))
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "3"))
+# chat.postMessage truncates text beyond 40k characters; stay well below it per post
+SLACK_MAX_TEXT = 3500
+
+_session = None
+_session_lock = threading.Lock()
 
 
-def send_slack_notification(message):
-    url = "https://slack.com/api/chat.postMessage"
+def _get_session():
+    # one keep-alive connection to slack.com shared by every post in the process
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        return _session
+
+
+def _post(message, channel=SLACK_CHANNEL):
     headers = {
         "Authorization": f"Bearer {SLACK_TOKEN}",
         "Content-Type": "application/json; charset=utf-8",
     }
-    data = {"channel": SLACK_CHANNEL, "text": message}
-
-    try:
-        # timeout added to avoid hanging forever
-        # The 'response' object captures the HTTP response from Slack's API after sending the POST request.
-        # It contains status info (like 200 OK), payload data, and error details if any.
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-        # Status info example:
-        #   response.status_code == 200  # OK: request succeeded
-        #   response.status_code == 400  # Bad Request
-        #   response.status_code == 401  # Unauthorized
-        #   response.status_code == 403  # Forbidden
-        #   response.status_code == 404  # Not Found
-        #   response.status_code == 429  # Too Many Requests (Rate limiting)
-        #   response.status_code == 500  # Internal Server Error (Slack problem)
-        response.raise_for_status()  # HTTP-level errors (4xx/5xx)
-
-        payload = response.json()
-        # Slack API-level error check (ok:false)
-        if not payload.get("ok", False):
-            print(f"Slack API error: {payload.get('error', 'unknown_error')}")
+    data = {"channel": channel, "text": message}
+
+    for attempt in range(SLACK_MAX_RETRIES + 1):
+        try:
+            # timeout added to avoid hanging forever
+            # The 'response' object captures the HTTP response from Slack's API after sending the POST request.
+            # It contains status info (like 200 OK), payload data, and error details if any.
+            response = _get_session().post(SLACK_URL, headers=headers, json=data, timeout=10)
+            # Status info example:
+            #   response.status_code == 200  # OK: request succeeded
+            #   response.status_code == 400  # Bad Request
+            #   response.status_code == 401  # Unauthorized
+            #   response.status_code == 403  # Forbidden
+            #   response.status_code == 404  # Not Found
+            #   response.status_code == 429  # Too Many Requests (Rate limiting)
+            #   response.status_code == 500  # Internal Server Error (Slack problem)
+            if response.status_code == 429 and attempt < SLACK_MAX_RETRIES:
+                # rate limited: Slack says how long to back off
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+                continue
+            response.raise_for_status()  # HTTP-level errors (4xx/5xx)
+
+            payload = response.json()
+            # Slack API-level error check (ok:false)
+            if not payload.get("ok", False):
+                print(f"Slack API error: {payload.get('error', 'unknown_error')}")
+                return False
+
+            return True
+
+        except requests.RequestException as e:
+            print(f"Slack request failed: {e}")
             return False
+    return False
+
+
+def _coalesce(messages):
+    """Join queued messages into as few posts as fit under SLACK_MAX_TEXT."""
+    posts, current = [], ""
+    for message in messages:
+        if current and len(current) + 1 + len(message) > SLACK_MAX_TEXT:
+            posts.append(current)
+            current = ""
+        current = f"{current}\n{message}" if current else message
+    if current:
+        posts.append(current)
+    return posts
+
+
+class SlackNotifier:
+    """Background queue that batches messages per coalescing window and posts them in order."""
+
+    def __init__(self, window=SLACK_COALESCE_SECONDS):
+        self.window = window
+        self._queue = deque()
+        self._pending = 0
+        self._failures = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="slack-notifier", daemon=True)
+        self._thread.start()
+
+    def submit(self, message):
+        with self._cond:
+            self._queue.append(message)
+            self._pending += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            # first message arrived: give the rest of the burst a moment to join it
+            time.sleep(self.window)
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+            failed = sum(not _post(post) for post in _coalesce(batch))
+            with self._cond:
+                self._failures += failed
+                self._pending -= len(batch)
+                self._cond.notify_all()
+
+    def flush(self, timeout=SLACK_FLUSH_TIMEOUT):
+        """Block until everything submitted so far is posted; False on timeout or a failed post."""
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._pending == 0, timeout)
+            failures, self._failures = self._failures, 0
+        return done and not failures
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = SlackNotifier()
+            # a daemon thread dies with the interpreter: post whatever is still queued first
+            atexit.register(_notifier.flush)
+        return _notifier
+
+
+def flush_notifications(timeout=SLACK_FLUSH_TIMEOUT):
+    """Wait for queued notifications (no-op when nothing was ever queued)."""
+    return _notifier.flush(timeout) if _notifier is not None else True
 
-        return True
 
-    except requests.RequestException as e:
-        print(f"Slack request failed: {e}")
-        return False
+def send_slack_notification(message, wait=None):
+    """
+    Post `message` to SLACK_CHANNEL. In async mode (SLACK_ASYNC=1, wait not set) the message is
+    queued and True is returned immediately; wait=True posts synchronously and returns
+    whether Slack accepted it.
+    """
+    if wait is None:
+        wait = not SLACK_ASYNC
+    if wait:
+        return _post(message)
+    get_notifier().submit(message)
+    return True
 
 
 # The following line ensures that the code block beneath it is only executed when this script is run directly,
@@ -65,7 +189,8 @@ if __name__ == "__main__":
     message = sys.argv[1] if len(sys.argv) > 1 else "Pipeline notification"
     
     # Sends the message to Slack via the send_slack_notification() function.
-    ok = send_slack_notification(message)
+    # wait=True: the CLI posts synchronously so its exit code reflects Slack's answer.
+    ok = send_slack_notification(message, wait=True)
     
     # Exits with status code 0 (success) if the message was sent, or 1 (failure) otherwise.
     sys.exit(0 if ok else 1)
\ No newline at end of file
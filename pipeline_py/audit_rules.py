@@ -0,0 +1,218 @@
+# audit_rules.py
+# Declarative audit rules. Each rule is plain data (a dict) in a registry; AuditRuleSet
+# compiles the registry once and evaluates every rule in a single pass over each chunk,
+# writing into one boolean matrix (rows x rules) instead of building a filtered
+# DataFrame per check. Adding a rule adds one column to the matrix, not another scan.
+import operator
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from audit_sketch import hash_keys
+
+COMPARE_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# Rule kinds:
+#   duplicate -> rows whose `columns` repeat (across all chunks seen so far)
+#   compare   -> `column` <op> `value`
+#   null      -> `column` is null
+PAYMENT_RULES = [
+    {
+        "name": "duplicate_payment_id",
+        "kind": "duplicate",
+        "columns": ["payment_id"],
+        "level": "❌ CRITICAL",
+        "message": "Found {count} duplicate payment IDs!",
+    },
+    {
+        "name": "amount_over_10",
+        "kind": "compare",
+        "column": "amount",
+        "op": ">",
+        "value": 10,
+        "level": "⚠️ WARNING",
+        "message": "Found {count} payments > ${value}.",
+    },
+]
+
+AUDIT_RULES = {"payment": PAYMENT_RULES}
+
+
+def register_rule(table, rule):
+    """Add a rule dict to the registry for `table` (used by every later AuditRuleSet for it)."""
+    AUDIT_RULES.setdefault(table, []).append(rule)
+
+
+def _contains(sorted_values, values):
+    """Vectorized membership test of `values` in the sorted array `sorted_values` (fastest for sorted `values`)."""
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(sorted_values, values)
+    return sorted_values[np.minimum(idx, len(sorted_values) - 1)] == values
+
+
+class _HashSet:
+    """
+    Set of uint64 hashes kept as a few sorted numpy runs (8 bytes per hash, no per-item objects).
+    Runs are merged like a binary counter, so each hash is re-sorted O(log n) times in total and
+    a lookup probes O(log n) runs with searchsorted.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(r) for r in self.runs)
+
+    def contains(self, values):
+        found = np.zeros(len(values), dtype=bool)
+        for run in self.runs:
+            found |= _contains(run, values)
+        return found
+
+    def add(self, new_values):
+        """Add sorted hashes that are not in the set yet."""
+        if len(new_values) == 0:
+            return
+        self.runs.append(new_values)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            newer, older = self.runs.pop(), self.runs.pop()
+            # two sorted runs: the stable sort (timsort) merges them in linear time
+            self.runs.append(np.sort(np.concatenate([older, newer]), kind="stable"))
+
+
+class _DuplicateState:
+    """
+    Cross-chunk duplicate tracking on 64-bit key hashes. A row is flagged when its key
+    repeats inside the chunk or was seen in an earlier chunk; the earlier, already
+    evaluated occurrence is added to the count (it cannot be flagged retroactively).
+    Seen and flagged hashes live in _HashSet (8 bytes per distinct key); each chunk
+    probes them once with its sorted distinct keys.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.seen = _HashSet()
+        self.flagged = _HashSet()
+        self.late_matches = 0
+
+    def __call__(self, chunk):
+        keys, inverse, counts = np.unique(hash_keys(chunk, self.columns), return_inverse=True, return_counts=True)
+        seen_before = self.seen.contains(keys)
+        repeated = (counts > 1) | seen_before
+
+        # only keys seen before can already be flagged, so only those are probed
+        already_flagged = np.zeros(len(keys), dtype=bool)
+        already_flagged[seen_before] = self.flagged.contains(keys[seen_before])
+        self.late_matches += int((seen_before & ~already_flagged).sum())
+        self.flagged.add(keys[repeated & ~already_flagged])
+        self.seen.add(keys[~seen_before])
+        return repeated[inverse.reshape(-1)]
+
+
+def _compile(rule, scales):
+    kind = rule["kind"]
+    if kind == "duplicate":
+        return _DuplicateState(rule["columns"])
+    if kind == "compare":
+        op, column = COMPARE_OPS[rule["op"]], rule["column"]
+        # decimal columns read as scaled ints (typed_reader) are compared against the scaled value
+        value = rule["value"] * scales.get(column, 1)
+        # nullable (masked) columns compare to <NA>, which is not a match
+        return lambda chunk: op(chunk[column], value).fillna(False).to_numpy(dtype=bool)
+    if kind == "null":
+        column = rule["column"]
+        return lambda chunk: pd.isna(chunk[column]).to_numpy()
+    raise ValueError(f"Unknown audit rule kind: {kind}")
+
+
+def _format(rule, count):
+    return f"{rule['level']}: " + rule["message"].format(count=count, **rule)
+
+
+def push_down_messages(engine, table, rules=None):
+    """
+    Count every compare/null rule for `table` inside the database with a single
+    SUM(CASE ...) query and return the report lines for the rules that matched.
+    Duplicate rules are skipped (they need the exact or approximate scan).
+    """
+    rules = [r for r in (rules if rules is not None else AUDIT_RULES.get(table, [])) if r["kind"] != "duplicate"]
+    if not rules:
+        return []
+    quote = engine.dialect.identifier_preparer.quote
+    params, cases = {}, []
+    for i, rule in enumerate(rules):
+        column = quote(rule["column"])
+        if rule["kind"] == "compare":
+            if rule["op"] not in COMPARE_OPS:
+                raise ValueError(f"Unknown compare op: {rule['op']}")
+            sql_op = "<>" if rule["op"] == "!=" else ("=" if rule["op"] == "==" else rule["op"])
+            params[f"v{i}"] = rule["value"]
+            condition = f"{column} {sql_op} :v{i}"
+        elif rule["kind"] == "null":
+            condition = f"{column} IS NULL"
+        else:
+            raise ValueError(f"Unknown audit rule kind: {rule['kind']}")
+        cases.append(f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)")
+
+    with engine.connect() as conn:
+        counts = conn.execute(text(f"SELECT {', '.join(cases)} FROM {quote(table)}"), params).one()
+    return [_format(rule, int(count or 0)) for rule, count in zip(rules, counts) if count]
+
+
+class AuditRuleSet:
+    """Compiled rule registry for one table; feed it chunks, then read the totals."""
+
+    def __init__(self, table="payment", rules=None, scales=None):
+        """`scales` maps a column to the factor its values were scaled by (see typed_reader.scales)."""
+        self.rules = list(rules if rules is not None else AUDIT_RULES.get(table, []))
+        self.names = [r["name"] for r in self.rules]
+        self._checks = [_compile(r, scales or {}) for r in self.rules]
+        self.counts = np.zeros(len(self.rules), dtype=np.int64)
+        self.rows = 0
+
+    @property
+    def columns(self):
+        """Every source column the rules read."""
+        cols = []
+        for rule in self.rules:
+            for col in rule.get("columns", [rule.get("column")]):
+                if col and col not in cols:
+                    cols.append(col)
+        return cols
+
+    def evaluate(self, chunk, known=None):
+        """
+        Evaluate every rule on `chunk` and return an (n_rows, n_rules) boolean mask matrix.
+        `known` maps a rule name to an extra precomputed mask that is OR-ed into that rule
+        (e.g. duplicates confirmed against an earlier run).
+        """
+        masks = np.zeros((len(chunk), len(self._checks)), dtype=bool)
+        for i, check in enumerate(self._checks):
+            masks[:, i] = check(chunk)
+            if known and self.names[i] in known:
+                masks[:, i] |= np.asarray(known[self.names[i]], dtype=bool)
+        self.counts += masks.sum(axis=0)
+        self.rows += len(chunk)
+        return masks
+
+    def results(self):
+        """List of (rule, count) with cross-chunk duplicate matches included."""
+        totals = []
+        for rule, check, count in zip(self.rules, self._checks, self.counts):
+            if isinstance(check, _DuplicateState):
+                count += check.late_matches
+            totals.append((rule, int(count)))
+        return totals
+
+    def messages(self):
+        """Report lines for every rule that matched at least one row."""
+        return [_format(rule, count) for rule, count in self.results() if count]
@@ -0,0 +1,269 @@
+# audit_sketch.py
+# Approximate duplicate auditing: instead of downloading and comparing every row,
+# stream only the key columns of a bounded sample through small, mergeable sketches.
+#   - block sample -> evenly spaced ranges of an integer key column (index range reads, so the
+#                     cost is bounded by AUDIT_APPROX_SAMPLE_ROWS, not the table size); every row
+#                     of a key is either in or out, so repeats are sampled at the same rate as rows
+#   - HyperLogLog  -> estimated number of distinct keys (+/- confidence bounds)
+#   - Bloom filter -> rows whose key was (probably) seen before = duplicate candidates
+#   - bottom-k sample -> a uniform random sample of candidate keys to show in the report
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, inspect, text
+
+from typed_reader import SCHEMAS, read_typed, unscale
+
+APPROX_THRESHOLD = float(os.getenv("AUDIT_APPROX_THRESHOLD", "0.001"))
+APPROX_CHUNKSIZE = int(os.getenv("AUDIT_APPROX_CHUNKSIZE", "200000"))
+APPROX_SAMPLE_ROWS = int(os.getenv("AUDIT_APPROX_SAMPLE_ROWS", "1000000"))
+APPROX_SAMPLE_BLOCKS = 64  # ranges the sample is spread over
+Z_95 = 1.96
+
+
+def _mix64(values, salt):
+    # splitmix64 finalizer: hash_pandas_object ignores hash_key for numeric columns,
+    # so independent hash functions are derived by re-mixing with a salt instead.
+    # the offset is computed in Python: a uint64 scalar product overflows (with a warning) for salt >= 2
+    z = values + np.uint64((salt * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_keys(df, keys, salt=0):
+    """64-bit hash per row of the key columns (same key -> same hash); each salt gives an independent hash."""
+    hashes = pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+    return _mix64(hashes, salt) if salt else hashes
+
+
+def _bit_length(values):
+    # Vectorized int.bit_length() for uint64 arrays (binary search over the shift width).
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+class HyperLogLog:
+    """Distinct-count sketch; 2**precision one-byte registers, relative error ~1.04/sqrt(2**precision)."""
+
+    def __init__(self, precision=14):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rank = ((64 - self.p) - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # small-range correction (linear counting)
+            return self.m * math.log(self.m / zeros)
+        return raw
+
+
+class BloomFilter:
+    """Bit-packed Bloom filter using double hashing over two independent 64-bit key hashes."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(int(capacity), 1)
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.k = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.inserted = 0
+
+    def _positions(self, h1, h2):
+        size = np.uint64(self.size)
+        return [((h1 + np.uint64(i) * h2) % size).astype(np.int64) for i in range(self.k)]
+
+    def contains(self, h1, h2):
+        found = np.ones(len(h1), dtype=bool)
+        for pos in self._positions(h1, h2):
+            found &= (self.bits[pos >> 3] & (1 << (pos & 7)).astype(np.uint8)) != 0
+        return found
+
+    def add(self, h1, h2):
+        for pos in self._positions(h1, h2):
+            np.bitwise_or.at(self.bits, pos >> 3, (1 << (pos & 7)).astype(np.uint8))
+        self.inserted += len(h1)
+
+    def merge(self, other):
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+        self.inserted += other.inserted
+
+    def false_positive_rate(self):
+        return (1 - math.exp(-self.k * self.inserted / self.size)) ** self.k
+
+
+class BottomKSample:
+    """Uniform sample without replacement: keep the k items with the smallest random priority (mergeable)."""
+
+    def __init__(self, k=20, seed=None):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.sample = pd.DataFrame()
+
+    def add(self, df):
+        if df.empty:
+            return
+        df = df.assign(_priority=self.rng.random(len(df)))
+        self.sample = pd.concat([self.sample, df], ignore_index=True).nsmallest(self.k, "_priority")
+
+    def rows(self):
+        return self.sample.drop(columns="_priority", errors="ignore").reset_index(drop=True)
+
+
+def _sample_plan(engine, table, keys, sample_rows=APPROX_SAMPLE_ROWS, blocks=APPROX_SAMPLE_BLOCKS):
+    """
+    How to sample `table`: `blocks` ranges of the first integer key column, one centred in each
+    equal slice of its MIN..MAX range, covering about `sample_rows` key values together. Falls back
+    to a full read (fraction 1.0) when no key is an integer or the key range is already that small.
+    Returns {"where", "params", "fraction", "capacity" (rows to size the Bloom filter for),
+    "column", "starts" (first key value of each block, None for a full read)}.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    types = {c["name"]: c["type"] for c in inspect(engine).get_columns(table)}
+    column = next((k for k in keys if isinstance(types.get(k), Integer)), None)
+    plan = {"where": None, "params": {}, "fraction": 1.0, "column": column, "starts": None}
+    with engine.connect() as conn:
+        if column is None:
+            # no integer key to sample on: the whole table is read, so its size is needed for the filter
+            plan["capacity"] = conn.execute(text(f"SELECT COUNT(*) FROM {quote(table)}")).scalar() or 0
+            return plan
+        # MIN/MAX of an indexed column are single index lookups
+        lo, hi = conn.execute(text(f"SELECT MIN({quote(column)}), MAX({quote(column)}) FROM {quote(table)}")).one()
+        span = 0 if lo is None else int(hi) - int(lo) + 1
+        plan["capacity"] = span
+        if span <= sample_rows:
+            return plan
+
+    blocks = max(2, min(blocks, sample_rows))
+    width = sample_rows // blocks
+    starts = [int(lo) + (span * i) // blocks + (span // blocks - width) // 2 for i in range(blocks)]
+    plan.update(
+        where=" OR ".join(f"{quote(column)} BETWEEN :lo{i} AND :hi{i}" for i in range(blocks)),
+        params={**{f"lo{i}": v for i, v in enumerate(starts)}, **{f"hi{i}": v + width - 1 for i, v in enumerate(starts)}},
+        fraction=blocks * width / span,
+        capacity=blocks * width,
+        starts=np.array(starts, dtype=np.int64),
+    )
+    return plan
+
+
+def _sampling_spread(block_rows, block_dups, fraction):
+    """~95% half-width of the duplicate rate from the spread between sampled blocks (cluster sampling)."""
+    n = len(block_rows)
+    if n < 2 or not block_rows.sum():
+        return 0.0
+    p = block_dups.sum() / block_rows.sum()
+    variance = ((block_dups - p * block_rows) ** 2).sum() / (n * (n - 1)) / block_rows.mean() ** 2
+    return Z_95 * math.sqrt(variance * (1 - fraction))
+
+
+def estimate_duplicates(engine, table, keys, chunksize=APPROX_CHUNKSIZE, error_rate=0.001, sample_size=20,
+                        sample_rows=APPROX_SAMPLE_ROWS):
+    """
+    Stream only `keys` of a block sample of `table` (see _sample_plan()) and estimate how many rows
+    repeat an earlier key. Every row of a key falls in the same block, so repeats are sampled at the
+    same rate as rows. Returns a dict with the estimated row count, HyperLogLog distinct estimate and
+    Bloom-filter duplicate estimate, scaled up from the sample and each with ~95% confidence bounds
+    (sketch error plus sampling error), the sampling fraction, and a sample of candidate keys.
+    """
+    plan = _sample_plan(engine, table, keys, sample_rows)
+    fraction, starts = plan["fraction"], plan["starts"]
+
+    hll = HyperLogLog()
+    bloom = BloomFilter(plan["capacity"], error_rate)
+    examples = BottomKSample(sample_size)
+    rows = candidates = 0
+    expected_false_positives = 0.0
+    blocks = 0 if starts is None else len(starts)
+    block_rows = np.zeros(blocks, dtype=np.int64)
+    block_dups = np.zeros(blocks, dtype=np.int64)
+
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in read_typed(conn, table, keys, where=plan["where"], params=plan["params"], chunksize=chunksize):
+            if chunk.empty:
+                continue
+            h1 = hash_keys(chunk, keys)
+            h2 = hash_keys(chunk, keys, salt=1) | np.uint64(1)
+            hll.add_hashes(h1)
+
+            # repeats inside this chunk are exact; repeats of earlier chunks come from the Bloom filter
+            within = pd.Series(h1).duplicated().to_numpy()
+            seen_before = bloom.contains(h1, h2)
+            expected_false_positives += bloom.false_positive_rate() * int((~within).sum())
+            flagged = within | seen_before
+            bloom.add(h1, h2)
+
+            rows += len(chunk)
+            candidates += int(flagged.sum())
+            examples.add(chunk[flagged])
+            if blocks:
+                block = np.searchsorted(starts, chunk[plan["column"]].to_numpy(dtype=np.int64), side="right") - 1
+                block_rows += np.bincount(block, minlength=blocks)
+                block_dups += np.bincount(block[flagged], minlength=blocks)
+
+    distinct = hll.estimate()
+    spread = Z_95 * hll.relative_error * distinct
+    fp_spread = Z_95 * math.sqrt(expected_false_positives)
+    dup_estimate = max(0.0, candidates - expected_false_positives)
+    dup_low = max(0.0, candidates - expected_false_positives - fp_spread)
+    dup_high = float(candidates)
+
+    def rate(n):
+        return n / rows if rows else 0.0
+
+    def scaled(n):
+        return round(n / fraction)
+
+    sampling = _sampling_spread(block_rows, block_dups, fraction)
+    total = scaled(rows)
+    return {
+        "table": table,
+        "keys": keys,
+        "rows": total,
+        "rows_sampled": rows,
+        "sample_fraction": fraction,
+        "distinct_estimate": scaled(distinct),
+        "distinct_low": max(0, scaled(distinct - spread)),
+        "distinct_high": min(total, scaled(distinct + spread)),
+        "bloom_candidates": candidates,
+        "duplicate_rows_estimate": scaled(dup_estimate),
+        "duplicate_rate": rate(dup_estimate),
+        "duplicate_rate_low": max(0.0, rate(dup_low) - sampling),
+        "duplicate_rate_high": min(1.0, rate(dup_high) + sampling),
+        "examples": unscale(examples.rows(), SCHEMAS.get(table, {})),
+    }
+
+
+def format_estimate(est):
+    sampled = (f" (from a {est['sample_fraction']:.2%} sample of {est['rows_sampled']} rows)"
+               if est["sample_fraction"] < 1 else "")
+    return (
+        f"≈ {est['duplicate_rows_estimate']} repeated rows in ≈ {est['rows']}{sampled} "
+        f"({est['duplicate_rate']:.4%}, 95% CI {est['duplicate_rate_low']:.4%} - {est['duplicate_rate_high']:.4%}); "
+        f"≈ {est['distinct_estimate']} distinct {'/'.join(est['keys'])} "
+        f"(95% CI {est['distinct_low']} - {est['distinct_high']})"
+    )
@@ -1,7 +1,8 @@
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text
 import pymysql
 from datetime import datetime
+import sqlite3
 import requests
 from dotenv import load_dotenv, find_dotenv
 import os
@@ -10,52 +11,239 @@ import sys
 sys.path.append(r'C:\Python\Basic\codes')
 # Now you can import the file name (without the .py extension)
 from SLACK import send_slack_notification
+from audit_sketch import APPROX_THRESHOLD, estimate_duplicates, format_estimate
+from audit_rules import AuditRuleSet, push_down_messages
+from db_engine import get_engine, mysql_dsn
+from stage_metrics import stage
+from typed_reader import PAYMENT_SCHEMA, coerce, projection, read_typed, scales
 
 # 1. CONFIGURATION
 # MySQL credentials
 load_dotenv(find_dotenv())
-# Fetching all components from .env
-user = os.getenv("DB_USER")
-pw = os.getenv("DB_PASS")
-host = os.getenv("DB_HOST")
-port = os.getenv("DB_PORT")
-db = os.getenv("DB_NAME")
+# Connection string built from the DB_* settings in .env (see db_engine.py)
+DB_CONN = mysql_dsn()
 
-# A cleaner, more professional connection string
-DB_CONN = f"mysql+pymysql://{user}:{pw}@{host}:{port}/{db}?charset=utf8mb4"
+# Incremental mode: only rows past the stored watermark are audited. The watermark and
+# an index of every payment_id already audited live in a small local SQLite file.
+AUDIT_INCREMENTAL = os.getenv("AUDIT_INCREMENTAL", "0") == "1"
+# Approximate mode: sketch the payment_id column first and only run the exact
+# audit when the estimated duplicate rate is above AUDIT_APPROX_THRESHOLD.
+AUDIT_APPROXIMATE = os.getenv("AUDIT_APPROXIMATE", "0") == "1"
+AUDIT_CHUNKSIZE = int(os.getenv("AUDIT_CHUNKSIZE", "50000"))
+AUDIT_STATE_DB = os.getenv("AUDIT_STATE_DB", os.path.join(os.getenv("EXPORT_PATH", "."), "audit_state.db"))
+# The incremental read filters on payment.last_update, which stock sakila does not index.
+# Without one every run is a full scan, so the run stops with an error unless the index exists
+# or AUDIT_CREATE_INDEX=1 lets the audit create it (DDL on the source table, off by default).
+AUDIT_CREATE_INDEX = os.getenv("AUDIT_CREATE_INDEX", "0") == "1"
+WATERMARK_INDEX = "ix_payment_last_update"
+SQLITE_BATCH = 900  # stay under SQLite's bound-parameter limit
 
 
 
-def run_audit():
+def _batched(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _open_audit_state(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    state = sqlite3.connect(path)
+    state.execute("CREATE TABLE IF NOT EXISTS seen_payment_ids (payment_id INTEGER PRIMARY KEY) WITHOUT ROWID")
+    state.execute("""
+        CREATE TABLE IF NOT EXISTS audit_watermark (
+            source TEXT PRIMARY KEY,
+            last_payment_id INTEGER,
+            last_update TEXT,
+            audited_at TEXT
+        )
+    """)
+    return state
+
+
+def _seen_ids(state, ids):
+    """Return the subset of `ids` that earlier runs have already audited."""
+    seen = set()
+    for batch in _batched(ids, SQLITE_BATCH):
+        placeholders = ", ".join("?" * len(batch))
+        rows = state.execute(f"SELECT payment_id FROM seen_payment_ids WHERE payment_id IN ({placeholders})", batch)
+        seen.update(r[0] for r in rows)
+    return seen
+
+
+def _confirmed_duplicate_ids(engine, ids):
+    """
+    A new row can reuse an audited payment_id either because it is a duplicate insert or because
+    the original row was updated. Count those IDs in the source table to tell the two apart.
+    """
+    confirmed = set()
+    with engine.connect() as conn:
+        for batch in _batched(ids, SQLITE_BATCH):
+            params = {f"id{i}": v for i, v in enumerate(batch)}
+            placeholders = ", ".join(f":{k}" for k in params)
+            rows = conn.execute(
+                text(f"SELECT payment_id FROM payment WHERE payment_id IN ({placeholders}) "
+                     f"GROUP BY payment_id HAVING COUNT(*) > 1"),
+                params,
+            )
+            confirmed.update(r[0] for r in rows)
+    return confirmed
+
+
+def _ensure_watermark_index(engine, create=AUDIT_CREATE_INDEX):
+    """Make sure payment.last_update leads an index, so the watermark query is a range scan."""
+    indexes = inspect(engine).get_indexes("payment")
+    if any(ix["column_names"][:1] == ["last_update"] for ix in indexes):
+        return
+    if not create:
+        raise RuntimeError(
+            "payment.last_update has no index: the incremental audit would scan the whole table. "
+            f"Create one (e.g. {WATERMARK_INDEX}) or set AUDIT_CREATE_INDEX=1."
+        )
+    print(f"Creating index {WATERMARK_INDEX} on payment.last_update for the incremental audit.")
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX {WATERMARK_INDEX} ON payment (last_update)"))
+
+
+def _read_since(conn, columns, params, chunksize):
+    """
+    Rows past the watermark, as two indexed range reads (primary key, last_update) combined
+    with UNION ALL; a single OR predicate over the two columns falls back to a full table scan.
+    The branches are disjoint on payment_id, so no row comes back twice, and UNION ALL keeps
+    exact double inserts (identical after projection) as separate rows for the duplicate rule.
+    """
+    query = (projection(conn, "payment", columns, "payment_id > :last_id")
+             + " UNION ALL "
+             + projection(conn, "payment", columns, "last_update >= :last_update AND payment_id <= :last_id"))
+    for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunksize):
+        yield coerce(chunk, PAYMENT_SCHEMA)
+
+
+def _report_rules(rules, report):
+    for msg in rules.messages():
+        report.append(msg)
+        print(msg)
+
+
+def _run_full_audit(engine, report, chunksize=AUDIT_CHUNKSIZE):
+    """
+    2. AUDIT: every rule in audit_rules.PAYMENT_RULES (duplicate payment IDs, payments > $10, ...)
+    is evaluated in one pass per chunk; no filtered DataFrame is built per check.
+    Only the columns the rules read are fetched, with the compact dtypes of typed_reader.
+    """
+    rules = AuditRuleSet("payment", scales=scales(PAYMENT_SCHEMA))
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in read_typed(conn, "payment", rules.columns, chunksize=chunksize):
+            rules.evaluate(chunk)
+    _report_rules(rules, report)
+    return rules.rows
+
+
+def _run_incremental_audit(engine, report, state_path=AUDIT_STATE_DB, chunksize=AUDIT_CHUNKSIZE):
+    """
+    Audit only the payments added or touched since the last run, checking their
+    payment_ids against the index of everything audited before.
+    last_update has one-second resolution, so the watermark second itself is re-read (>=):
+    rows committed later within that second are picked up, and the ones already audited
+    are dropped again through the seen-ID index.
+    The watermark and index are committed only after the whole batch succeeds.
+    """
+    state = _open_audit_state(state_path)
     try:
-        engine = create_engine(DB_CONN)
-        df = pd.read_sql("SELECT * FROM payment", engine)
+        mark = state.execute(
+            "SELECT last_payment_id, last_update FROM audit_watermark WHERE source = 'payment'"
+        ).fetchone()
+        if mark:
+            _ensure_watermark_index(engine)
+            print(f"Incremental audit from payment_id > {mark[0]} or last_update >= {mark[1]}")
+            params = {"last_id": mark[0], "last_update": mark[1]}
+            last_id, last_update = mark
+        else:
+            print("No audit watermark yet: auditing the full table once to build the index.")
+            last_id, last_update = None, None
+
+        rules = AuditRuleSet("payment", scales=scales(PAYMENT_SCHEMA))
+        # payment_id and last_update drive the index and the watermark
+        columns = list(dict.fromkeys(["payment_id", *rules.columns, "last_update"]))
+        with engine.connect().execution_options(stream_results=True) as conn:
+            chunks = (_read_since(conn, columns, params, chunksize) if mark
+                      else read_typed(conn, "payment", columns, chunksize=chunksize))
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                ids = chunk['payment_id'].unique().tolist()
+                # Rows re-fetched only because their last_update moved are not duplicates,
+                # so IDs already in the index are confirmed against the source first.
+                seen = _seen_ids(state, ids)
+                confirmed = _confirmed_duplicate_ids(engine, sorted(seen)) if seen else set()
+                if mark and seen:
+                    # already audited at the watermark second: a re-read, not a new or updated row
+                    reread = ((chunk['last_update'].astype(str) == str(mark[1]))
+                              & chunk['payment_id'].isin(seen) & ~chunk['payment_id'].isin(confirmed))
+                    chunk = chunk[~reread.to_numpy()]
+                    if chunk.empty:
+                        continue
+                rules.evaluate(chunk, known={"duplicate_payment_id": chunk['payment_id'].isin(confirmed).to_numpy()})
+
+                state.executemany(
+                    "INSERT OR IGNORE INTO seen_payment_ids (payment_id) VALUES (?)", ((int(i),) for i in ids)
+                )
+                chunk_max_id = int(chunk['payment_id'].max())
+                last_id = chunk_max_id if last_id is None else max(last_id, chunk_max_id)
+                chunk_max_update = str(chunk['last_update'].max())
+                last_update = chunk_max_update if last_update is None else max(last_update, chunk_max_update)
+
+        print(f"Audited {rules.rows} new or updated rows.")
+        _report_rules(rules, report)
+        audited = rules.rows
+
+        if last_id is not None:
+            state.execute(
+                "INSERT OR REPLACE INTO audit_watermark (source, last_payment_id, last_update, audited_at) "
+                "VALUES ('payment', ?, ?, ?)",
+                (last_id, last_update, datetime.now().isoformat(timespec='seconds')),
+            )
+        state.commit()
+    except Exception:
+        state.rollback()
+        raise
+    finally:
+        state.close()
+    return audited
+
+
+def _run_approximate_audit(engine, report, threshold=APPROX_THRESHOLD):
+    """Returns True when the estimate is above `threshold` and the exact audit should run."""
+    est = estimate_duplicates(engine, "payment", ["payment_id"])
+    print(f"Approximate audit: {format_estimate(est)}")
+    if est["duplicate_rate"] > threshold:
+        print(f"Estimated duplicate rate is above {threshold:.4%}: running the exact audit.")
+        return True
+
+    # the row-level rules (payments > $10, ...) are counted inside the database in one query
+    for msg in push_down_messages(engine, "payment"):
+        report.append(msg)
+        print(msg)
+    return False
+
+
+def run_audit(incremental=None, approximate=None):
+    incremental = AUDIT_INCREMENTAL if incremental is None else incremental
+    approximate = AUDIT_APPROXIMATE if approximate is None else approximate
+    try:
+        engine = get_engine(DB_CONN)
         
         # 'report' is a list used to collect audit issue messages identified during the data audit,
         # so they can be printed and also sent as a summary (if any issues are found) to Slack.
         report = []
         print(f"\n--- Starting Audit: {datetime.now().strftime('%Y-%m-%d %H:%M')} ---")
 
-        # 2. AUDIT: DUPLICATES
-        # This line checks for duplicate records in the DataFrame based on the 'payment_id' column.
-        # The pandas .duplicated('payment_id', keep=False) method returns a boolean Series that is True 
-        # for all rows that have the same value in 'payment_id' as another row (including all duplicates, not just the second occurrence).
-        # By using df[ ... ], we filter the original DataFrame to only those rows where 'payment_id' is duplicated.
-        
-        # The resulting 'duplicates' DataFrame will contain every row involved in a duplicate 'payment_id', 
-        # which can then be summarized, reported, or further analyzed.
-        duplicates = df[df.duplicated('payment_id', keep=False)]
-        if not duplicates.empty:
-            msg = f"❌ CRITICAL: Found {len(duplicates)} duplicate payment IDs!"
-            report.append(msg)
-            print(msg)
-
-        # 3. AUDIT: IMPOSSIBLE DATA
-        impossible = df[df['amount'] > 10]
-        if not impossible.empty:
-            msg = f"⚠️ WARNING: Found {len(impossible)} payments > $10."
-            report.append(msg)
-            print(msg)
+        run_exact = True
+        if approximate:
+            with stage("audit", "sketch"):
+                run_exact = _run_approximate_audit(engine, report)
+        if run_exact:
+            with stage("audit", "incremental_audit" if incremental else "full_audit") as s:
+                s.rows = _run_incremental_audit(engine, report) if incremental else _run_full_audit(engine, report)
 
         # 4. SEND ALERT IF ISSUES FOUND
         if report:
@@ -70,10 +258,16 @@ def run_audit():
         error_msg = f"🚨 Pipeline Failed: {str(e)}"
         print(error_msg)
         send_slack_notification(error_msg)
+        # re-raise after alerting so run_pipelines / CI see the failure
+        raise
 
 
 
 
-if __name__ == "__main__":
+def main():
     run_audit()
     send_slack_notification("✅  audit check completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# benchmark.py
+# Synthetic-data benchmarks for the audit, duplicate, validation and load paths.
+# Generates sakila-like `payment` / `mypayment` tables of a chosen size, duplicate rate and
+# outlier rate into a local SQLite file (or any SQLAlchemy DSN, e.g. a local MySQL),
+# then times every path in a fresh process so peak RSS is per case.
+# Results are compared with a stored baseline; a case slower or hungrier than the
+# baseline by more than --tolerance fails the run (exit code 1).
+#
+# Usage:
+#   python pipeline_py/benchmark.py --rows 10000 100000 --update-baseline   # record a baseline
+#   python pipeline_py/benchmark.py --rows 10000 100000                     # compare against it
+#   python pipeline_py/benchmark.py --rows 1000000 --dsn mysql+pymysql://root:pw@localhost/bench
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from bulk_loader import bulk_load
+from db_engine import dispose_all, get_engine
+from stage_metrics import peak_rss_mb
+
+BENCH_BASELINE = os.getenv("BENCH_BASELINE") or os.path.join(os.getenv("EXPORT_PATH") or ".", "benchmark_baseline.json")
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))
+# timings this short are mostly noise and never count as a regression
+BENCH_MIN_SECONDS = float(os.getenv("BENCH_MIN_SECONDS", "0.05"))
+GENERATE_CHUNK = 500_000
+
+SAKILA_AMOUNTS = np.array([0.99, 1.99, 2.99, 3.99, 4.99, 5.99, 6.99, 7.99, 8.99, 9.99])
+OUTLIER_AMOUNTS = np.array([10.99, 11.99])
+
+
+def payment_frame(rows, dup_rate=0.01, outlier_rate=0.05, start_id=1, seed=0):
+    """
+    Sakila-like payment rows. `dup_rate` of the rows copy payment_id and amount from an
+    earlier row of the same frame; `outlier_rate` of the amounts are above $10.
+    """
+    rng = np.random.default_rng(seed)
+    payment_id = np.arange(start_id, start_id + rows, dtype=np.int64)
+    amount = rng.choice(SAKILA_AMOUNTS, rows)
+    outliers = rng.random(rows) < outlier_rate
+    amount[outliers] = rng.choice(OUTLIER_AMOUNTS, int(outliers.sum()))
+
+    dups = np.flatnonzero(rng.random(rows) < dup_rate)
+    dups = dups[dups > 0]
+    sources = (rng.random(len(dups)) * dups).astype(np.int64)  # always an earlier row
+    payment_id[dups] = payment_id[sources]
+    amount[dups] = amount[sources]
+
+    return pd.DataFrame({
+        "payment_id": payment_id,
+        "customer_id": rng.integers(1, 600, rows, dtype=np.int16),
+        "staff_id": rng.integers(1, 3, rows, dtype=np.int8),
+        "rental_id": np.arange(start_id, start_id + rows, dtype=np.int64),
+        "amount": amount,
+        "payment_date": pd.Timestamp("2005-05-24") + pd.to_timedelta(rng.integers(0, 86400 * 270, rows), unit="s"),
+        "last_update": pd.Timestamp("2006-02-15 22:12:30"),
+    })
+
+
+def titanic_frame(rows, outlier_rate=0.05, seed=0):
+    """Titanic-shaped rows; `outlier_rate` of them break one TITANIC_CONTRACT rule."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "PassengerId": np.arange(1, rows + 1),
+        "Survived": rng.integers(0, 2, rows),
+        "Pclass": rng.integers(1, 4, rows),
+        "Name": [f"Passenger {i}" for i in range(rows)],
+        "Sex": rng.choice(["male", "female"], rows),
+        "Age": rng.uniform(0.5, 80, rows).round(1),
+        "Fare": rng.uniform(0, 500, rows).round(2),
+    })
+    bad = rng.random(rows) < outlier_rate
+    df.loc[bad, "Fare"] = -1.0
+    return df
+
+
+def populate(engine, rows, dup_rate, outlier_rate, seed=0):
+    """(Re)create payment and mypayment with `rows` generated rows, written in chunks."""
+    quote = engine.dialect.identifier_preparer.quote
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, start in enumerate(range(0, rows, GENERATE_CHUNK)):
+            chunk = payment_frame(min(GENERATE_CHUNK, rows - start), dup_rate, outlier_rate,
+                                  start_id=start + 1, seed=seed + i)
+            bulk_load(chunk, "payment", engine, if_exists="replace" if i == 0 else "append",
+                      indexes={"ix_payment_payment_id": ["payment_id"]})
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {quote('mypayment')}")
+        conn.exec_driver_sql(f"CREATE TABLE {quote('mypayment')} AS SELECT * FROM {quote('payment')}")
+
+
+# Each case: (setup(engine, rows, options) -> state, run(engine, state) -> rows processed)
+def _audit_full(engine, state):
+    import auditor
+    return auditor._run_full_audit(engine, [])
+
+
+def _audit_incremental(engine, state):
+    import auditor
+    with tempfile.TemporaryDirectory(prefix="bench_audit_") as tmp:
+        return auditor._run_incremental_audit(engine, [], state_path=os.path.join(tmp, "state.db"))
+
+
+def _audit_approximate(engine, state):
+    import auditor
+    auditor._run_approximate_audit(engine, [])
+    return state["rows"]
+
+
+def _duplicates_memory(engine, state):
+    import dup_pipelines
+    with engine.connect() as conn:
+        return dup_pipelines._memory_duplicates(conn, dup_pipelines.DUP_TABLE, dup_pipelines.DUP_KEYS)[1]
+
+
+def _duplicates_streaming(engine, state):
+    import dup_pipelines
+    with engine.connect().execution_options(stream_results=True) as conn:
+        return dup_pipelines._stream_duplicates(conn, dup_pipelines.DUP_TABLE, dup_pipelines.DUP_KEYS,
+                                                dup_pipelines.DUP_CHUNKSIZE,
+                                                dup_pipelines.DUP_MEMORY_LIMIT_MB * 1024 * 1024)[1]
+
+
+def _duplicates_near(engine, state):
+    import dup_pipelines
+    return dup_pipelines._near_duplicate_scan(engine, False, dup_pipelines.DUP_CHUNKSIZE,
+                                              dup_pipelines.DUP_MEMORY_LIMIT_MB,
+                                              dup_pipelines.NEAR_DUP_WINDOW_SECONDS)[1]
+
+
+def _duplicate_check(engine, state):
+    import App_duplicate
+    App_duplicate.run_duplicate_check(engine, "payment", "payment_id")
+    return state["rows"]
+
+
+def _validate(engine, state):
+    import data_validator
+    data_validator.validate_titanic_data(state["titanic"])
+    return len(state["titanic"])
+
+
+def _load_bulk(engine, state):
+    bulk_load(state["frame"], "bench_load", engine, if_exists="replace")
+    return len(state["frame"])
+
+
+def _load_to_sql(engine, state):
+    state["frame"].to_sql("bench_load", engine, if_exists="replace", index=False, chunksize=10000)
+    return len(state["frame"])
+
+
+def _no_setup(rows, options):
+    return {"rows": rows}
+
+
+def _payment_setup(rows, options):
+    return {"rows": rows, "frame": payment_frame(rows, options["dup_rate"], options["outlier_rate"])}
+
+
+def _titanic_setup(rows, options):
+    return {"rows": rows, "titanic": titanic_frame(rows, options["outlier_rate"])}
+
+
+CASES = {
+    "audit_full": (_no_setup, _audit_full),
+    "audit_incremental": (_no_setup, _audit_incremental),
+    "audit_approximate": (_no_setup, _audit_approximate),
+    "duplicates_memory": (_no_setup, _duplicates_memory),
+    "duplicates_streaming": (_no_setup, _duplicates_streaming),
+    "duplicates_near": (_no_setup, _duplicates_near),
+    "duplicate_check": (_no_setup, _duplicate_check),
+    "validate_titanic": (_titanic_setup, _validate),
+    "load_bulk": (_payment_setup, _load_bulk),
+    "load_to_sql": (_payment_setup, _load_to_sql),
+}
+
+
+def _run_case(case, dsn, rows, options, repeat):
+    """Runs inside a fresh process: setup, then the timed section `repeat` times."""
+    setup, run = CASES[case]
+    engine = get_engine(dsn)
+    state = setup(rows, options)
+    rss_start = peak_rss_mb()
+    timings = []
+    processed = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            processed = run(engine, state)
+            timings.append(time.perf_counter() - start)
+    rss_end = peak_rss_mb()
+    dispose_all()
+    seconds = min(timings)
+    return {
+        "seconds": round(seconds, 4),
+        "rows": processed,
+        "rows_per_sec": round(processed / seconds) if processed and seconds else None,
+        "peak_rss_mb": round(rss_end, 1) if rss_end is not None else None,
+        "peak_rss_growth_mb": round(rss_end - rss_start, 1) if rss_end is not None else None,
+    }
+
+
+def run_benchmarks(sizes, cases=None, dsn=None, dup_rate=0.01, outlier_rate=0.05, repeat=1):
+    """Returns {"<case>@<rows>": result dict} for every case at every size."""
+    cases = list(cases or CASES)
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark case(s): {', '.join(unknown)}")
+    options = {"dup_rate": dup_rate, "outlier_rate": outlier_rate}
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_db_") as tmp:
+        dsn = dsn or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        for rows in sizes:
+            print(f"🧪 Generating {rows} payment rows (dup rate {dup_rate:.2%}, outlier rate {outlier_rate:.2%})...")
+            populate(get_engine(dsn), rows, dup_rate, outlier_rate)
+            dispose_all()
+            for case in cases:
+                # a fresh interpreter per case: peak RSS and caches do not leak between cases
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    result = pool.submit(_run_case, case, dsn, rows, options, repeat).result()
+                results[f"{case}@{rows}"] = result
+                print(f"   {case:<22}{result['seconds']:>10.3f}s{result['rows_per_sec'] or 0:>12} rows/s"
+                      f"{result['peak_rss_mb'] or 0:>10.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance=BENCH_TOLERANCE):
+    """Regression messages for every result worse than its baseline by more than `tolerance`."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if result["seconds"] > BENCH_MIN_SECONDS and result["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append(f"{key}: {result['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        if result.get("peak_rss_mb") and base.get("peak_rss_mb") and \
+                result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: {result['peak_rss_mb']:.1f} MB vs baseline {base['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audit and load paths on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="table sizes to generate")
+    parser.add_argument("--cases", nargs="*", help=f"subset of: {', '.join(CASES)} (default: all)")
+    parser.add_argument("--dsn", help="SQLAlchemy URL of the stand-in database (default: temp SQLite file)")
+    parser.add_argument("--dup-rate", type=float, default=0.01)
+    parser.add_argument("--outlier-rate", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per case (best is kept)")
+    parser.add_argument("--baseline", default=BENCH_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE)
+    args = parser.parse_args()
+
+    try:
+        results = run_benchmarks(args.rows, args.cases, args.dsn, args.dup_rate, args.outlier_rate, args.repeat)
+    except ValueError as e:
+        parser.error(str(e))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"📌 Baseline updated: {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print(f"❌ Regression: {message}")
+    if not baseline:
+        print("⚠️ No baseline stored yet; run with --update-baseline to record one.")
+    elif not regressions:
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
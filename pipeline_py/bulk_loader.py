@@ -0,0 +1,334 @@
+# bulk_loader.py
+# Shared high-throughput loader for the MySQL load paths (titanic, ranking, data_validator).
+# Instead of df.to_sql() with pandas' loose inferred types, it:
+#   1. creates the table from explicit, compact DDL (smallest int type, sized VARCHARs, DOUBLE),
+#   2. loads rows in chunked multi-row INSERTs (pymysql batches executemany into one INSERT per chunk)
+#      or, with method="infile", through LOAD DATA LOCAL INFILE from a temp CSV,
+#   3. creates secondary indexes only after the data is in,
+#   4. reports rows/sec.
+# With if_exists="swap" the rows go into a shadow table (optionally from several parallel
+# writers) that replaces the live table in one atomic RENAME TABLE, so readers never see
+# a missing or half-loaded table and a failed load leaves the live table untouched.
+# bulk_swap() does the same for several related tables, renaming all of them in one statement.
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Float, Integer, MetaData,
+                        SmallInteger, String, Table, Text, inspect, text)
+from sqlalchemy.dialects import mysql
+
+BULK_CHUNKSIZE = int(os.getenv("BULK_CHUNKSIZE", "10000"))
+BULK_METHOD = os.getenv("BULK_METHOD", "insert")  # "insert" or "infile"
+LOAD_WRITERS = int(os.getenv("LOAD_WRITERS", "1"))
+MAX_VARCHAR = 1024
+
+# (min, max, mysql type, unsigned, generic fallback) from smallest to largest
+_INT_TYPES = [
+    (-2**7, 2**7 - 1, mysql.TINYINT, False, SmallInteger),
+    (0, 2**8 - 1, mysql.TINYINT, True, SmallInteger),
+    (-2**15, 2**15 - 1, mysql.SMALLINT, False, SmallInteger),
+    (0, 2**16 - 1, mysql.SMALLINT, True, Integer),
+    (-2**23, 2**23 - 1, mysql.MEDIUMINT, False, Integer),
+    (0, 2**24 - 1, mysql.MEDIUMINT, True, Integer),
+    (-2**31, 2**31 - 1, mysql.INTEGER, False, Integer),
+    (0, 2**32 - 1, mysql.INTEGER, True, BigInteger),
+]
+
+
+def _varchar_length(max_len):
+    # leave headroom so later appends with slightly longer values still fit
+    return min(MAX_VARCHAR, max(32, int(2 ** np.ceil(np.log2(max(max_len, 1) * 1.5)))))
+
+
+def _int_range(series):
+    return (int(series.min()), int(series.max())) if series.notna().any() else (0, 0)
+
+
+def _smallest_int(lo, hi):
+    """First _INT_TYPES entry whose range holds [lo, hi], or None when only BIGINT does."""
+    for entry in _INT_TYPES:
+        if entry[0] <= lo and hi <= entry[1]:
+            return entry
+    return None
+
+
+def column_type(series):
+    """Smallest SQL type that holds `series` (MySQL-specific where it matters)."""
+    if pd.api.types.is_bool_dtype(series):
+        return Boolean()
+    if pd.api.types.is_integer_dtype(series):
+        entry = _smallest_int(*_int_range(series))
+        if entry is None:
+            return BigInteger()
+        _, _, mysql_type, unsigned, generic = entry
+        return generic().with_variant(mysql_type(unsigned=unsigned), "mysql")
+    if pd.api.types.is_float_dtype(series):
+        return Float(precision=53).with_variant(mysql.DOUBLE(), "mysql")
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return DateTime()
+    max_len = int(series.dropna().astype(str).str.len().max() or 0) if series.notna().any() else 0
+    if max_len * 1.5 > MAX_VARCHAR:
+        return Text()
+    return String(_varchar_length(max_len))
+
+
+def build_table(df, table_name, metadata=None):
+    metadata = metadata or MetaData()
+    return Table(table_name, metadata, *[Column(str(c), column_type(df[c])) for c in df.columns])
+
+
+def _rows(df):
+    # NaN/NaT -> None so the driver sends NULL; pandas Timestamps -> datetime for every driver
+    columns = []
+    for c in df.columns:
+        series = df[c]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            columns.append([None if pd.isna(v) else v.to_pydatetime() for v in series])
+        else:
+            columns.append(series.astype(object).where(series.notna(), None).to_numpy())
+    return list(zip(*columns))
+
+
+def _widened_int(current, series):
+    """
+    Wider MySQL integer type for an existing `current` column that `series` would overflow,
+    or None when it still fits. The new type also covers the old type's range.
+    """
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series) or series.notna().sum() == 0:
+        return None
+    name = getattr(current, "__visit_name__", "").upper()
+    unsigned = bool(getattr(current, "unsigned", False))
+    old = next((e for e in _INT_TYPES if e[2].__visit_name__.upper() == name and e[3] == unsigned), None)
+    if old is None:
+        return None  # BIGINT or not an integer column
+    lo, hi = _int_range(series.dropna())
+    if old[0] <= lo and hi <= old[1]:
+        return None
+    entry = _smallest_int(min(lo, old[0]), max(hi, old[1]))
+    return mysql.BIGINT(unsigned=False) if entry is None else entry[2](unsigned=entry[3])
+
+
+def _widen_columns(conn, table_name, df):
+    """
+    Before an append, grow any VARCHAR or integer column that the new rows would overflow (MySQL).
+    Types are sized from the first chunk, so later chunks may need more room.
+    """
+    if conn.dialect.name != "mysql":
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    for col in inspect(conn).get_columns(table_name):
+        name = col["name"]
+        if name not in df.columns:
+            continue
+        if isinstance(col["type"], String) and getattr(col["type"], "length", None):
+            length = col["type"].length
+            needed = int(df[name].dropna().astype(str).str.len().max() or 0) if df[name].notna().any() else 0
+            if needed > length:
+                new_type = f"VARCHAR({_varchar_length(needed)})" if needed * 1.5 <= MAX_VARCHAR else "TEXT"
+                conn.execute(text(f"ALTER TABLE {quote(table_name)} MODIFY {quote(name)} {new_type}"))
+            continue
+        new_int = _widened_int(col["type"], df[name])
+        if new_int is not None:
+            conn.execute(text(
+                f"ALTER TABLE {quote(table_name)} MODIFY {quote(name)} {new_int.compile(dialect=conn.dialect)}"
+            ))
+
+
+def _insert_chunks(conn, table_name, df, chunksize):
+    quote = conn.dialect.identifier_preparer.quote
+    marker = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    columns = ", ".join(quote(str(c)) for c in df.columns)
+    sql = f"INSERT INTO {quote(table_name)} ({columns}) VALUES ({', '.join([marker] * len(df.columns))})"
+    cursor = conn.connection.cursor()
+    try:
+        for start in range(0, len(df), chunksize):
+            cursor.executemany(sql, _rows(df.iloc[start:start + chunksize]))
+    finally:
+        cursor.close()
+
+
+def _infile_chunks(conn, table_name, df, chunksize):
+    """
+    LOAD DATA LOCAL INFILE per chunk. The connection needs local_infile, which db_engine.get_engine()
+    turns on for MySQL engines when BULK_METHOD=infile.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    columns = ", ".join(quote(str(c)) for c in df.columns)
+    with tempfile.TemporaryDirectory(prefix="bulk_load_") as tmp:
+        path = os.path.join(tmp, "chunk.csv").replace("\\", "/")
+        for start in range(0, len(df), chunksize):
+            chunk = df.iloc[start:start + chunksize].copy()
+            for c in chunk.columns:
+                # str (pandas 3) or object text: backslashes must be escaped for ESCAPED BY '\\'
+                if pd.api.types.is_string_dtype(chunk[c]) or chunk[c].dtype == object:
+                    chunk[c] = chunk[c].astype("string").str.replace("\\", "\\\\", regex=False)
+                elif pd.api.types.is_bool_dtype(chunk[c]):
+                    chunk[c] = chunk[c].astype("Int8")
+            chunk.to_csv(path, index=False, header=False, na_rep="\\N", lineterminator="\n")
+            conn.execute(text(
+                f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {quote(table_name)} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                f"LINES TERMINATED BY '\\n' ({columns})"
+            ))
+
+
+def _load_rows(conn, table_name, df, chunksize, method):
+    is_mysql = conn.dialect.name == "mysql"
+    if is_mysql:
+        # per-session: skip unique/FK checks while bulk inserting into the fresh table
+        conn.execute(text("SET SESSION unique_checks = 0, foreign_key_checks = 0"))
+    try:
+        if method == "infile" and is_mysql:
+            _infile_chunks(conn, table_name, df, chunksize)
+        else:
+            _insert_chunks(conn, table_name, df, chunksize)
+    finally:
+        if is_mysql:
+            conn.execute(text("SET SESSION unique_checks = 1, foreign_key_checks = 1"))
+
+
+def _create_indexes(conn, table_name, indexes):
+    quote = conn.dialect.identifier_preparer.quote
+    for index_name, columns in (indexes or {}).items():
+        cols = ", ".join(quote(c) for c in columns)
+        conn.execute(text(f"CREATE INDEX {quote(index_name)} ON {quote(table_name)} ({cols})"))
+
+
+def staging_table(table_name):
+    """Name of the shadow table that the swap loads fill before replacing `table_name`."""
+    return f"{table_name}__staging"
+
+
+def _stage(df, table_name, engine, chunksize, method, writers):
+    """(Re)create `<table>__staging` and load `df` into it with `writers` parallel writers."""
+    staging, retired = staging_table(table_name), f"{table_name}__old"
+    quote = engine.dialect.identifier_preparer.quote
+    is_mysql = engine.dialect.name == "mysql"
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(staging)}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(retired)}"))
+        build_table(df, staging).create(conn)
+
+    # each writer loads its own slice on its own pooled connection; SQLite allows one writer
+    writers = max(1, min(writers if is_mysql else 1, len(df) // max(chunksize, 1) or 1))
+    slices = np.array_split(np.arange(len(df)), writers)
+
+    def write(rows):
+        with engine.begin() as conn:
+            _load_rows(conn, staging, df.iloc[rows], chunksize, method)
+
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        list(pool.map(write, slices))
+
+
+def _swap_in(engine, indexes):
+    """Replace every table in `indexes` (table -> its index map) by its staging copy at once."""
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        existing = [t for t in indexes if inspect(conn).has_table(t)]
+        if engine.dialect.name == "mysql":
+            # index names are per table in MySQL, so the shadows can be indexed before the swap
+            for table_name, table_indexes in indexes.items():
+                _create_indexes(conn, f"{table_name}__staging", table_indexes)
+            # one RENAME TABLE is atomic across all the tables it names
+            renames = [f"{quote(t)} TO {quote(t + '__old')}" for t in existing]
+            renames += [f"{quote(t + '__staging')} TO {quote(t)}" for t in indexes]
+            conn.execute(text("RENAME TABLE " + ", ".join(renames)))
+            for table_name in existing:
+                conn.execute(text(f"DROP TABLE {quote(table_name + '__old')}"))
+        else:
+            # other backends (e.g. SQLite) have transactional DDL: drops + renames commit together
+            for table_name, table_indexes in indexes.items():
+                if table_name in existing:
+                    conn.execute(text(f"DROP TABLE {quote(table_name)}"))
+                conn.execute(text(f"ALTER TABLE {quote(table_name + '__staging')} RENAME TO {quote(table_name)}"))
+                _create_indexes(conn, table_name, table_indexes)
+
+
+def _swap_load(frames, engine, indexes, chunksize, method, writers):
+    """Load each frame into `<table>__staging`, then swap them all in with a single RENAME TABLE."""
+    quote = engine.dialect.identifier_preparer.quote
+    try:
+        for table_name, df in frames.items():
+            _stage(df, table_name, engine, chunksize, method, writers)
+        _swap_in(engine, {t: (indexes or {}).get(t) for t in frames})
+    except Exception:
+        with engine.begin() as conn:
+            for table_name in frames:
+                conn.execute(text(f"DROP TABLE IF EXISTS {quote(table_name + '__staging')}"))
+        raise
+
+
+def swap_staged(table_name, engine, indexes=None):
+    """
+    Swap a `staging_table(table_name)` filled by the caller (e.g. chunk by chunk with bulk_load
+    replace/append) in over `table_name`, like if_exists="swap" does. The staging table is dropped
+    if the swap fails, leaving the live table untouched.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {quote(table_name + '__old')}"))
+        _swap_in(engine, {table_name: indexes})
+    except Exception:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {quote(staging_table(table_name))}"))
+        raise
+
+
+def _report(stats, label):
+    print(f"📦 Bulk loaded {stats['rows']} rows into {label} in {stats['seconds']}s "
+          f"({stats['rows_per_sec']} rows/sec).")
+    return stats
+
+
+def _stats(rows, start):
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds) if seconds else 0}
+
+
+def bulk_load(df, table_name, engine, if_exists="replace", indexes=None,
+              chunksize=BULK_CHUNKSIZE, method=BULK_METHOD, writers=LOAD_WRITERS):
+    """
+    Load `df` into `table_name` and return {"rows", "seconds", "rows_per_sec"}.
+    if_exists="replace" drops and recreates the table from typed DDL; "append" adds rows
+    (creating the table if needed); "swap" loads a shadow table with `writers` parallel
+    writers and atomically renames it over the live table. `indexes` maps index name ->
+    list of columns and is applied after the load, only when the table is newly created.
+    """
+    start = time.perf_counter()
+    if if_exists == "swap":
+        _swap_load({table_name: df}, engine, {table_name: indexes}, chunksize, method, writers)
+    else:
+        with engine.begin() as conn:
+            exists = inspect(conn).has_table(table_name)
+            if exists and if_exists == "replace":
+                conn.execute(text(f"DROP TABLE {conn.dialect.identifier_preparer.quote(table_name)}"))
+                exists = False
+            if not exists:
+                build_table(df, table_name).create(conn)
+            else:
+                _widen_columns(conn, table_name, df)
+
+            _load_rows(conn, table_name, df, chunksize, method)
+            if not exists:
+                _create_indexes(conn, table_name, indexes)
+
+    return _report(_stats(len(df), start), table_name)
+
+
+def bulk_swap(frames, engine, indexes=None, chunksize=BULK_CHUNKSIZE, method=BULK_METHOD, writers=LOAD_WRITERS):
+    """
+    Swap-load several related tables together: `frames` maps table name -> DataFrame and
+    `indexes` table name -> index map. Every table is loaded into its shadow first, then all
+    of them replace the live tables in one RENAME TABLE, so readers never join a new table
+    against an old one. Returns the combined {"rows", "seconds", "rows_per_sec"}.
+    """
+    start = time.perf_counter()
+    _swap_load(frames, engine, indexes, chunksize, method, writers)
+    return _report(_stats(sum(len(df) for df in frames.values()), start), ", ".join(frames))
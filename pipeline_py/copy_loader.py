@@ -0,0 +1,169 @@
+# copy_loader.py
+# Streams a CSV body (e.g. an HTTP response) straight into Postgres with COPY ... FROM STDIN.
+# No DataFrame is built: the bytes go from the socket to the server in COPY_CHUNK_BYTES pieces,
+# so memory stays flat whatever the file size, and COPY is one round trip instead of
+# row-batched INSERTs. The rows land in a staging table that replaces the target table
+# in the same transaction (readers never see a half-loaded table).
+# Columns keep the types pd.to_sql() used to give them, so the models built on the raw table
+# see the same schema: types declared in `column_types` are used as-is, and every other column
+# is typed from its staged values like pandas infers a CSV (BIGINT when every value is an
+# integer, DOUBLE PRECISION when every value is numeric or some are missing, TEXT otherwise).
+#
+#   stats = copy_csv(payload.iter_content(), "raw_university_ranking", engine)
+#   stats = copy_csv(chunks, "raw_university_ranking", engine, column_types={"Teaching Score": "NUMERIC(4,1)"})
+import csv
+import io
+import itertools
+import os
+import time
+
+COPY_CHUNK_BYTES = int(os.getenv("COPY_CHUNK_BYTES", str(1 << 20)))
+COPY_TRANSFORM_BATCH = 10000  # rows per re-encoded chunk when a transform is applied
+
+# what pandas' CSV parser accepts as int64 / float64 (surrounding blanks allowed)
+_INTEGER_PATTERN = r"^\s*[-+]?[0-9]{1,18}\s*$"
+_NUMERIC_PATTERN = r"^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$"
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (what copy_expert reads from)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _peek_header(chunks):
+    """(column names, chunks including the header again) without consuming the stream."""
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if b"\n" in head:
+            break
+    if not head:
+        raise ValueError("CSV stream is empty")
+    line = head.split(b"\n", 1)[0].decode("utf-8").lstrip("\ufeff")
+    header = next(csv.reader([line]))
+    return header, itertools.chain([head], chunks)
+
+
+def _transformed(chunks, transform, batch=COPY_TRANSFORM_BATCH):
+    """
+    Re-encode the CSV with `transform(row) -> row | None` applied to every data row (None drops
+    the row). Rows are parsed and written with the csv module in batches, never all at once.
+    """
+    reader = csv.reader(io.TextIOWrapper(io.BufferedReader(_ChunkReader(chunks)), encoding="utf-8", newline=""))
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(next(reader))
+    for rows in iter(lambda: list(itertools.islice(reader, batch)), []):
+        writer.writerows(r for r in map(transform, rows) if r is not None)
+        yield out.getvalue().encode("utf-8")
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+
+def _copy(cursor, sql, chunks):
+    if hasattr(cursor, "copy_expert"):  # psycopg2
+        cursor.copy_expert(sql, _ChunkReader(chunks), size=COPY_CHUNK_BYTES)
+    else:  # psycopg 3
+        with cursor.copy(sql) as copy:
+            for chunk in chunks:
+                copy.write(chunk)
+    return cursor.rowcount
+
+
+def _inferred_types(cursor, staging, columns, quote):
+    """
+    {column: type} for the TEXT `columns` of `staging`, the way pd.read_csv + to_sql typed them:
+    BIGINT for all-integer columns without NULLs, DOUBLE PRECISION for numeric (or NULL-only) ones.
+    Text columns are left out. One scan of the staging table covers every column.
+    """
+    if not columns:
+        return {}
+    checks = []
+    for c in columns:
+        checks.append(f"bool_and({quote(c)} ~ '{_INTEGER_PATTERN}') AND COUNT({quote(c)}) = COUNT(*)")
+        checks.append(f"COALESCE(bool_and({quote(c)} ~ '{_NUMERIC_PATTERN}'), TRUE)")
+    cursor.execute(f"SELECT {', '.join(checks)} FROM {staging}")
+    flags = cursor.fetchone()
+    types = {}
+    for i, c in enumerate(columns):
+        is_int, is_numeric = flags[2 * i], flags[2 * i + 1]
+        if is_int:
+            types[c] = "BIGINT"
+        elif is_numeric:
+            types[c] = "DOUBLE PRECISION"
+    return types
+
+
+def copy_csv(chunks, table, engine, transform=None, swap=True, column_types=None):
+    """
+    COPY the UTF-8 CSV in `chunks` (an iterable of bytes, header first) into `<table>_staging` with one
+    column per header field, then (swap=True) drop `table` and rename the staging table to it
+    in the same transaction. `column_types` maps column -> SQL type for the staging DDL; the other
+    columns are staged as TEXT and converted to their inferred type (see _inferred_types()) in a
+    single ALTER TABLE before the swap. `transform` is an optional per-row callable, see _transformed().
+    Returns {"rows", "seconds", "rows_per_sec"}.
+    """
+    start = time.perf_counter()
+    header, chunks = _peek_header(chunks)
+    if transform is not None:
+        chunks = _transformed(chunks, transform)
+
+    quote = engine.dialect.identifier_preparer.quote
+    staging = quote(f"{table}_staging")
+    columns = ", ".join(quote(c) for c in header)
+    declared = column_types or {}
+    unknown = set(declared) - set(header)
+    if unknown:
+        raise ValueError(f"column_types names columns missing from the CSV header: {sorted(unknown)}")
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        ddl = ", ".join(f"{quote(c)} {declared.get(c, 'TEXT')}" for c in header)
+        cursor.execute(f"CREATE TABLE {staging} ({ddl})")
+        rows = _copy(cursor, f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true, "
+                             f"ENCODING 'UTF8')", chunks)
+        if rows is None or rows < 0:
+            cursor.execute(f"SELECT COUNT(*) FROM {staging}")
+            rows = cursor.fetchone()[0]
+        inferred = _inferred_types(cursor, staging, [c for c in header if c not in declared], quote)
+        if inferred:
+            cursor.execute(f"ALTER TABLE {staging} " + ", ".join(
+                f"ALTER COLUMN {quote(c)} TYPE {t} USING {quote(c)}::{t}" for c, t in inferred.items()
+            ))
+        if swap:
+            cursor.execute(f"DROP TABLE IF EXISTS {quote(table)}")
+            cursor.execute(f"ALTER TABLE {staging} RENAME TO {quote(table)}")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    seconds = time.perf_counter() - start
+    stats = {"rows": rows, "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds) if seconds else 0}
+    print(f"📥 COPY loaded {stats['rows']} rows into {table if swap else f'{table}_staging'} "
+          f"in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec).")
+    return stats
@@ -1,9 +1,15 @@
 import pandas as pd
+import numpy as np
+import itertools
 import logging
 import os
-import pymysql
-from sqlalchemy import create_engine
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+from bulk_loader import bulk_load, staging_table, swap_staged
+from db_engine import ensure_database, get_engine, mysql_dsn
+from sqlalchemy import text
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,6 +20,105 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Data contract for the Titanic feed, declared as data: one entry per column.
+#   dtype    -> "numeric" or "string"; numeric values that do not parse fail the row
+#   nullable -> False fails rows with a missing value
+#   min/max  -> inclusive numeric range
+#   allowed  -> whitelist of values
+# Columns missing from the file are a schema error and stop the load; every other
+# rule is evaluated per row, so bad rows can be quarantined while good rows load.
+TITANIC_CONTRACT = {
+    "PassengerId": {"dtype": "numeric", "nullable": False},
+    "Survived": {"dtype": "numeric", "nullable": False, "allowed": [0, 1]},
+    "Pclass": {"dtype": "numeric", "nullable": False, "allowed": [1, 2, 3]},
+    "Age": {"dtype": "numeric", "nullable": True, "min": 0},
+    "Fare": {"dtype": "numeric", "nullable": True, "min": 0},
+}
+
+VALIDATION_CHUNKSIZE = int(os.getenv("VALIDATION_CHUNKSIZE", "100000"))
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "1"))
+
+
+def check_schema(df, contract=TITANIC_CONTRACT):
+    """Table-level check: every contract column must exist."""
+    missing = set(contract) - set(df.columns)
+    return [f"Missing columns: {missing}"] if missing else []
+
+
+def validate_chunk(df, contract=TITANIC_CONTRACT):
+    """
+    Evaluate every contract rule on one chunk, vectorized per column.
+    Returns (good_rows, bad_rows, {rule: failed row count}); numeric columns are
+    coerced and bad rows get a 'failed_rules' column naming the rules they broke.
+    """
+    df = df.copy()
+    rule_masks = []
+
+    for column, spec in contract.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if spec.get("dtype") == "numeric" and not pd.api.types.is_numeric_dtype(values):
+            coerced = pd.to_numeric(values, errors="coerce")
+            rule_masks.append((f"{column}: not numeric", (coerced.isna() & values.notna()).to_numpy()))
+            df[column] = values = coerced
+
+        missing = values.isna().to_numpy()
+        if not spec.get("nullable", True):
+            rule_masks.append((f"{column}: null", missing))
+        if "min" in spec:
+            rule_masks.append((f"{column}: below {spec['min']}", ~missing & (values < spec["min"]).to_numpy()))
+        if "max" in spec:
+            rule_masks.append((f"{column}: above {spec['max']}", ~missing & (values > spec["max"]).to_numpy()))
+        if "allowed" in spec:
+            rule_masks.append((f"{column}: not in {spec['allowed']}", ~missing & ~values.isin(spec["allowed"]).to_numpy()))
+
+    passed = np.ones(len(df), dtype=bool)
+    failures = {}
+    for rule, mask in rule_masks:
+        count = int(mask.sum())
+        if count:
+            failures[rule] = count
+            passed &= ~mask
+
+    bad = df[~passed]
+    if not bad.empty:
+        # label only the failing rows, so clean chunks pay nothing for it
+        labels = pd.Series("", index=bad.index)
+        for rule, mask in rule_masks:
+            if rule in failures:
+                labels = labels.where(~mask[~passed], labels + rule + "; ")
+        bad = bad.assign(failed_rules=labels.str.rstrip("; "))
+    return df[passed], bad, failures
+
+
+def _validate_chunk_task(args):
+    # module-level so ProcessPoolExecutor can pickle it
+    chunk, contract = args
+    return validate_chunk(chunk, contract)
+
+
+def validate_chunks(chunks, contract=TITANIC_CONTRACT, workers=VALIDATION_WORKERS):
+    """
+    Validate an iterable of DataFrames, across a process pool when workers > 1.
+    Yields (good_rows, bad_rows, failures) per chunk, in input order; at most
+    2 * workers chunks are in flight so memory stays bounded for large files.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield validate_chunk(chunk, contract)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_validate_chunk_task, (chunk, contract)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 def validate_titanic_data(df):
     """
     Performs critical data quality checks for the Titanic dataset.
@@ -23,26 +128,11 @@ def validate_titanic_data(df):
     
     try:
         # 1. Schema Check: Ensure all required columns exist
-        required_cols = {'PassengerId', 'Survived', 'Pclass', 'Age', 'Fare'}
-        # This checks if any required columns are missing from the dataframe.
-        # If the set of required columns is NOT a subset of columns in df, then there are missing columns.
-        if not required_cols.issubset(df.columns):
-            missing = required_cols - set(df.columns)
-            errors.append(f"Missing columns: {missing}")
-
-        # 2. Type Check: Age should be numeric
-        if 'Age' in df.columns and not pd.api.types.is_numeric_dtype(df['Age']):
-            errors.append("Data Quality Issue: 'Age' column is not numeric.")
-
-        # 3. Logic Check: Fare cannot be negative
-        if 'Fare' in df.columns and (df['Fare'] < 0).any():
-            #negative_count = df[df['Fare'] < 0].shape[0]
-            negative_count = len(df[df['Fare'] < 0])
-            errors.append(f"Validation Failure: Found {negative_count} records with negative Fares.")
-
-        # 4. Completeness Check: Survived should not have nulls
-        if 'Survived' in df.columns and df['Survived'].isnull().any():
-            errors.append("Integrity Error: Found null values in 'Survived' column.")
+        errors.extend(check_schema(df))
+
+        # 2. Row Checks: types, ranges and nulls from TITANIC_CONTRACT
+        _, _, failures = validate_chunk(df)
+        errors.extend(f"Validation Failure: {count} records failed '{rule}'." for rule, count in failures.items())
 
     except Exception as e:
         logging.error(f"Unexpected error during validation: {e}")
@@ -56,40 +146,99 @@ def validate_titanic_data(df):
             logging.error(f"❌ {error}")
         return False, errors
 
-def load_to_mysql(df, table_name="titanic_records"):
+
+def _quarantine(bad_rows, path, first):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    bad_rows.to_csv(path, index=False, mode="w" if first else "a", header=first)
+
+
+def run_validated_load(source, table_name="titanic_records", contract=TITANIC_CONTRACT,
+                       chunksize=VALIDATION_CHUNKSIZE, workers=VALIDATION_WORKERS, quarantine_path=None):
     """
-    Creates the database if it doesn't exist and loads the DataFrame to MySQL.
+    Stream `source` (CSV path or URL) in chunks, validate each chunk against `contract`,
+    load the good rows and write the bad rows to a quarantine CSV.
+    Good rows go into a staging table chunk by chunk, and the staging table replaces `table_name`
+    in one swap only after every chunk has loaded; a schema error or a failed load aborts the run
+    and leaves the live table as it was. Returns (rows loaded, rows quarantined, {rule: failed row count}).
     """
-    # Fetching all components from .env
-    host = os.getenv("DB_HOST")
-    user = os.getenv("DB_USER")
-    db_pass = os.getenv("DB_PASS")
-    port = os.getenv("DB_PORT", "3306")
-    db_name = "titanic_db"
+    quarantine_path = quarantine_path or os.path.join(os.getenv("EXPORT_PATH", "."), f"quarantine_{table_name}.csv")
+    reader = pd.read_csv(source, chunksize=chunksize)
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        logging.warning("Source is empty; nothing to validate.")
+        return 0, 0, {}
+
+    schema_errors = check_schema(first_chunk, contract)
+    if schema_errors:
+        for error in schema_errors:
+            logging.error(f"❌ {error}")
+        raise ValueError(f"Schema check failed: {schema_errors}")
 
+    loaded = quarantined = 0
+    totals = {}
+    staging = staging_table(table_name)
+    staged = False
+    chunks = itertools.chain([first_chunk], reader)
     try:
-        # 1. Connect to MySQL server (without DB) to ensure the DB exists
-        conn = pymysql.connect(
-            host=host,
-            user=user,
-            password=db_pass,
-            port=int(port)
-        )
-        with conn.cursor() as cursor:
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
-        conn.commit()
-        conn.close()
-
-        # 2. Create SQLAlchemy engine to specific database
-        connection_uri = f"mysql+pymysql://{user}:{db_pass}@{host}:{port}/{db_name}?charset=utf8mb4"
-        engine = create_engine(connection_uri)
-
-        # 3. Load data
-        df.to_sql(table_name, con=engine, if_exists='replace', index=False)
-        logging.info(f"🚀 Successfully loaded {len(df)} rows into {table_name}.")
+        for good, bad, failures in validate_chunks(chunks, contract, workers):
+            for rule, count in failures.items():
+                totals[rule] = totals.get(rule, 0) + count
+            if not good.empty:
+                staged = True
+                load_to_mysql(good, staging, if_exists="replace" if loaded == 0 else "append")
+                loaded += len(good)
+            if not bad.empty:
+                _quarantine(bad, quarantine_path, first=quarantined == 0)
+                quarantined += len(bad)
+        if loaded:
+            swap_staged(table_name, _titanic_engine())
+    except Exception:
+        if staged:
+            _drop_table(staging)
+        raise
+
+    for rule, count in totals.items():
+        logging.warning(f"⚠️ {count} records failed '{rule}' and were quarantined.")
+    if quarantined:
+        logging.warning(f"🧪 {quarantined} bad rows written to {quarantine_path}; {loaded} good rows loaded.")
+    else:
+        logging.info(f"✅ All Data Quality checks passed for {loaded} rows.")
+    return loaded, quarantined, totals
+
+
+def _titanic_engine(db_name="titanic_db"):
+    # Server credentials come from the DB_* settings in .env (see db_engine.py)
+    # 1. Ensure the DB exists (pooled server-level connection, reused across chunks)
+    ensure_database(db_name)
+    # 2. Shared pooled engine for the specific database
+    return get_engine(mysql_dsn(db_name))
+
+
+def _drop_table(table_name):
+    """Drop a leftover (e.g. staging) table; failures are only logged, the original error matters more."""
+    try:
+        engine = _titanic_engine()
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {engine.dialect.identifier_preparer.quote(table_name)}"))
+    except Exception as e:
+        logging.error(f"Could not drop {table_name}: {e}")
+
+
+def load_to_mysql(df, table_name="titanic_records", if_exists="replace"):
+    """
+    Creates the database if it doesn't exist and loads the DataFrame to MySQL.
+    Logs and re-raises any failure so the caller stops instead of reporting a load that did not happen.
+    """
+    try:
+        engine = _titanic_engine()
+
+        # Load data (typed DDL + chunked multi-row inserts)
+        stats = bulk_load(df, table_name, engine, if_exists=if_exists)
+        logging.info(f"🚀 Successfully loaded {len(df)} rows into {table_name} ({stats['rows_per_sec']} rows/sec).")
 
     except Exception as e:
         logging.error(f"Failed to load data to MySQL: {e}")
+        raise
 
 # --- Execution Block ---
 if __name__ == "__main__":
@@ -98,16 +247,9 @@ if __name__ == "__main__":
     logging.info("Fetching data from source...")
     
     try:
-        titanic_df = pd.read_csv(URL)
-        
-        # 2. Validate data
-        success, errors = validate_titanic_data(titanic_df)
-        
-        # 3. Load data only if validation passes
-        if success:
-            load_to_mysql(titanic_df)
-        else:
-            logging.warning(f"Data load aborted. {len(errors)} validation errors found.")
+        # 2. Validate chunk by chunk; good rows load, bad rows go to quarantine
+        run_validated_load(URL)
             
     except Exception as e:
-        logging.critical(f"Pipeline failed: {e}")
\ No newline at end of file
+        logging.critical(f"Pipeline failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,80 @@
+# db_engine.py
+# One place to build database connections for every pipeline script.
+# Engines are created lazily and cached per DSN, so pipelines running in the same
+# process share one warm connection pool instead of each paying TCP + auth handshakes.
+import os
+import threading
+
+from dotenv import load_dotenv, find_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
+
+load_dotenv(find_dotenv())
+
+# Pool tuning (see env.example)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; stay below MySQL wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# bulk_loader's BULK_METHOD=infile uses LOAD DATA LOCAL INFILE, which PyMySQL refuses unless
+# the connection is opened with local_infile
+DB_LOCAL_INFILE = os.getenv("BULK_METHOD", "insert") == "infile"
+
+_engines = {}
+_databases = set()
+_lock = threading.Lock()
+
+
+def mysql_dsn(database=None, user=None, password=None, host=None, port=None):
+    """MySQL DSN from explicit values, falling back to the DB_* settings in .env."""
+    url = URL.create(
+        "mysql+pymysql",
+        username=user or os.getenv("DB_USER"),
+        password=password or os.getenv("DB_PASS"),
+        host=host or os.getenv("DB_HOST"),
+        port=int(port or os.getenv("DB_PORT") or 3306),
+        database=database or os.getenv("DB_NAME"),
+        query={"charset": "utf8mb4"},
+    )
+    return url.render_as_string(hide_password=False)
+
+
+def get_engine(dsn=None, **engine_kwargs):
+    """
+    Return the shared Engine for `dsn` (default: mysql_dsn()), creating it on first use.
+    Extra keyword arguments are passed to create_engine and become part of the cache key.
+    """
+    dsn = dsn or mysql_dsn()
+    key = (dsn, tuple(sorted(engine_kwargs.items())))
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+            url = make_url(dsn)
+            if url.get_backend_name() != "sqlite":
+                options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+            if DB_LOCAL_INFILE and url.get_backend_name() == "mysql":
+                options["connect_args"] = {"local_infile": True}
+            options.update(engine_kwargs)
+            engine = _engines[key] = create_engine(dsn, **options)
+        return engine
+
+
+def ensure_database(database):
+    """CREATE DATABASE IF NOT EXISTS through a pooled server-level engine (once per process)."""
+    if database in _databases:
+        return
+    server = get_engine(make_url(mysql_dsn()).set(database=None).render_as_string(hide_password=False))
+    quote = server.dialect.identifier_preparer.quote
+    with server.begin() as conn:
+        conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {quote(database)}"))
+    _databases.add(database)
+
+
+def dispose_all():
+    """Close every pooled connection (e.g. at the end of a runner process)."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _databases.clear()
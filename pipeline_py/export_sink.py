@@ -0,0 +1,151 @@
+# export_sink.py
+# Pluggable export sink for the pipeline outputs (duplicates, rankings, titanic).
+# Frames are written chunk by chunk as Parquet (row group per chunk) or Arrow IPC with
+# compression, or as gzip/zstd CSV, into Hive-style date partitions:
+#   <base>/<dataset>/run_date=YYYY-MM-DD/part-....parquet
+# so readers (pyarrow.dataset, pd.read_parquet, DuckDB, Spark) can prune by run date.
+# pyarrow is optional: without it the columnar formats fall back to gzip CSV.
+import gzip
+import os
+import shutil
+from datetime import date, datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # columnar formats need pyarrow
+    pa = pq = None
+
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "parquet")  # parquet | arrow | csv
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "")  # empty -> default for the format
+EXPORT_PARTITION = os.getenv("EXPORT_PARTITION", "1") == "1"
+EXPORT_CHUNKSIZE = int(os.getenv("EXPORT_CHUNKSIZE", "50000"))
+
+_DEFAULT_COMPRESSION = {"parquet": "zstd", "arrow": "zstd", "csv": "gzip"}
+_EXTENSIONS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "csv": {"gzip": ".csv.gz", "zstd": ".csv.zst", "none": ".csv"},
+}
+
+
+def _resolve(fmt, compression):
+    fmt = (fmt or EXPORT_FORMAT).lower()
+    compression = (compression or EXPORT_COMPRESSION or "").lower() or None
+    if fmt not in _DEFAULT_COMPRESSION:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt != "csv" and pa is None:
+        print(f"⚠️ pyarrow is not installed; exporting gzip CSV instead of {fmt}.")
+        fmt, compression = "csv", (compression if compression in ("gzip", "zstd", "none") else None)
+    return fmt, compression or _DEFAULT_COMPRESSION[fmt]
+
+
+class ExportSink:
+    """
+    Streaming writer for one dataset export. Use as a context manager and call write()
+    per chunk; the file only appears at its final path after a successful close().
+    mode="overwrite" replaces the run date's partition (or the single file when unpartitioned);
+    mode="append" adds a new part file (unpartitioned CSV appends to the one file, like before).
+    """
+
+    def __init__(self, dataset, base_path=None, fmt=None, compression=None,
+                 partition=None, mode="overwrite", run_date=None):
+        if mode not in ("overwrite", "append"):
+            raise ValueError(f"Unknown export mode: {mode}")
+        self.format, self.compression = _resolve(fmt, compression)
+        self.partition = EXPORT_PARTITION if partition is None else partition
+        self.mode = mode
+        self.rows = 0
+
+        base_path = base_path or os.getenv("EXPORT_PATH", ".")
+        ext = _EXTENSIONS[self.format]
+        ext = ext[self.compression] if isinstance(ext, dict) else ext
+        stamp = datetime.now().strftime("%H%M%S%f")
+        if self.partition:
+            self.directory = os.path.join(base_path, dataset, f"run_date={(run_date or date.today()).isoformat()}")
+            name = "part-0000" if mode == "overwrite" else f"part-{stamp}"
+        elif mode == "append" and self.format != "csv":
+            self.directory, name = base_path, f"{dataset}-{date.today():%Y%m%d}-{stamp}"
+        else:
+            self.directory, name = base_path, dataset
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, name + ext)
+        self._tmp = f"{self.path}.{os.getpid()}.tmp"
+        self._append_to_existing = mode == "append" and os.path.exists(self.path)
+        self._writer = self._handle = None
+
+    def _open(self, first_chunk):
+        if self.format == "parquet":
+            self._schema = pa.Table.from_pandas(first_chunk, preserve_index=False).schema
+            self._writer = pq.ParquetWriter(self._tmp, self._schema, compression=self.compression)
+        elif self.format == "arrow":
+            self._schema = pa.Table.from_pandas(first_chunk, preserve_index=False).schema
+            self._handle = pa.OSFile(self._tmp, "wb")
+            options = pa.ipc.IpcWriteOptions(compression=None if self.compression == "none" else self.compression)
+            self._writer = pa.ipc.new_file(self._handle, self._schema, options=options)
+        elif self.compression == "gzip":
+            self._handle = gzip.open(self._tmp, "wt", encoding="utf-8", newline="")
+        elif self.compression == "zstd":
+            import zstandard  # optional, only for zstd CSV
+            self._handle = zstandard.open(self._tmp, "wt", encoding="utf-8", newline="")
+        else:
+            self._handle = open(self._tmp, "w", encoding="utf-8", newline="")
+
+    def write(self, chunk):
+        """Append one DataFrame chunk (same columns as the first one)."""
+        first = self._writer is None and self._handle is None
+        if first:
+            self._open(chunk)
+        if self.format == "csv":
+            chunk.to_csv(self._handle, index=False, header=first and not self._append_to_existing)
+        else:
+            self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+        self.rows += len(chunk)
+
+    def _finish_writers(self):
+        if self._writer is not None and self.format != "csv":
+            self._writer.close()
+        if self._handle is not None:
+            self._handle.close()
+
+    def close(self):
+        self._finish_writers()
+        if not os.path.exists(self._tmp):
+            return self.path
+        if self._append_to_existing:
+            # gzip members / zstd frames / plain text can simply be concatenated
+            with open(self._tmp, "rb") as src, open(self.path, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self._tmp)
+        else:
+            os.replace(self._tmp, self.path)
+        if self.partition and self.mode == "overwrite":
+            # one snapshot per run date: drop parts from earlier runs of the same day
+            for name in os.listdir(self.directory):
+                old = os.path.join(self.directory, name)
+                if old != self.path and name.startswith("part-") and not name.endswith(".tmp"):
+                    os.remove(old)
+        return self.path
+
+    def abort(self):
+        self._finish_writers()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def export_frame(df, dataset, chunksize=EXPORT_CHUNKSIZE, **sink_options):
+    """Write `df` through an ExportSink in `chunksize` slices and return the final path."""
+    with ExportSink(dataset, **sink_options) as sink:
+        for start in range(0, max(len(df), 1), chunksize):
+            sink.write(df.iloc[start:start + chunksize])
+    return sink.path
@@ -0,0 +1,162 @@
+# http_cache.py
+# Local extraction cache for the HTTP sources (Titanic CSV, hipolabs JSON, rankings CSV).
+# Each URL's payload is stored with its ETag / Last-Modified and a SHA-256 of the body.
+# The next fetch is a conditional GET, so an unchanged source costs one 304 response,
+# and a pipeline can skip transform + load entirely when the payload is byte-identical
+# to the one it last loaded successfully. fetch_stream() is the same conditional GET for
+# bodies that are streamed into a loader instead of being held in memory.
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import requests
+
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(os.getenv("EXPORT_PATH", "."), ".http_cache"))
+# HTTP_CACHE_FORCE=1 reports every payload as changed (forces a full reload)
+HTTP_CACHE_FORCE = os.getenv("HTTP_CACHE_FORCE", "0") == "1"
+
+
+class CachedFetch:
+    """Result of fetch(): the payload bytes plus whether the pipeline still needs to load them."""
+
+    def __init__(self, url, content, sha256, status, meta_path, meta):
+        self.url = url
+        self.content = content
+        self.sha256 = sha256
+        self.status = status  # 200 = downloaded, 304 = served from cache
+        self._meta_path = meta_path
+        self._meta = meta
+
+    @property
+    def changed(self):
+        return HTTP_CACHE_FORCE or self._meta.get("loaded_sha256") != self.sha256
+
+
+def _paths(url, cache_dir):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.body"), os.path.join(cache_dir, f"{key}.json")
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def fetch(url, session=None, timeout=30, cache_dir=None):
+    """
+    GET `url` through the cache. Sends If-None-Match / If-Modified-Since when a cached
+    copy exists and serves the cached body on 304. Raises for HTTP errors like requests does.
+    """
+    cache_dir = cache_dir or HTTP_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    body_path, meta_path = _paths(url, cache_dir)
+
+    meta = {}
+    if os.path.exists(meta_path) and os.path.exists(body_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = (session or requests).get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and meta:
+        with open(body_path, "rb") as f:
+            content = f.read()
+        return CachedFetch(url, content, meta["sha256"], 304, meta_path, meta)
+
+    response.raise_for_status()
+    content = response.content
+    sha256 = hashlib.sha256(content).hexdigest()
+    if sha256 != meta.get("sha256"):
+        _write_atomic(body_path, content)
+    meta.update(
+        url=url,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        sha256=sha256,
+        fetched_at=datetime.now().isoformat(timespec="seconds"),
+    )
+    _write_atomic(meta_path, json.dumps(meta, indent=2).encode("utf-8"))
+    return CachedFetch(url, content, sha256, response.status_code, meta_path, meta)
+
+
+class StreamedFetch:
+    """
+    Result of fetch_stream(): iterate iter_content() once to consume the body. The SHA-256 and
+    validators are recorded as the chunks go by, so mark_loaded() works as for fetch().
+    """
+
+    def __init__(self, url, response, status, meta_path, meta):
+        self.url = url
+        self.response = response  # None on 304
+        self.status = status
+        self.sha256 = meta.get("sha256")
+        self._meta_path = meta_path
+        self._meta = meta
+
+    @property
+    def changed(self):
+        # a 304 has no body to stream, whatever HTTP_CACHE_FORCE says; fetch_stream() skips the
+        # validators when forcing, so a forced fetch always gets one
+        return self.response is not None
+
+    def iter_content(self, chunk_size=1 << 20):
+        digest = hashlib.sha256()
+        with self.response:
+            for chunk in self.response.iter_content(chunk_size):
+                digest.update(chunk)
+                yield chunk
+        self.sha256 = digest.hexdigest()
+        self._meta.update(
+            url=self.url,
+            etag=self.response.headers.get("ETag"),
+            last_modified=self.response.headers.get("Last-Modified"),
+            sha256=self.sha256,
+            fetched_at=datetime.now().isoformat(timespec="seconds"),
+        )
+        _write_atomic(self._meta_path, json.dumps(self._meta, indent=2).encode("utf-8"))
+
+
+def fetch_stream(url, session=None, timeout=30, cache_dir=None):
+    """
+    Conditional GET that does not buffer or cache the body, for sources streamed straight into a
+    loader. Validators are only sent when the last streamed body was loaded successfully (there is
+    no cached copy to fall back to), so a 304 always means "already loaded". With HTTP_CACHE_FORCE=1
+    no validators are sent and the body is always downloaded.
+    """
+    cache_dir = cache_dir or HTTP_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    _, meta_path = _paths(url, cache_dir)
+
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+    headers = {}
+    if not HTTP_CACHE_FORCE and meta.get("sha256") and meta.get("loaded_sha256") == meta["sha256"]:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = (session or requests).get(url, headers=headers, timeout=timeout, stream=True)
+    if response.status_code == 304 and headers:
+        response.close()
+        return StreamedFetch(url, None, 304, meta_path, meta)
+    response.raise_for_status()
+    return StreamedFetch(url, response, response.status_code, meta_path, meta)
+
+
+def mark_loaded(fetched):
+    """Record that `fetched` was transformed and loaded, so an identical payload is skipped next time."""
+    fetched._meta["loaded_sha256"] = fetched.sha256
+    fetched._meta["loaded_at"] = datetime.now().isoformat(timespec="seconds")
+    _write_atomic(fetched._meta_path, json.dumps(fetched._meta, indent=2).encode("utf-8"))
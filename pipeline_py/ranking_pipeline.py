@@ -1,11 +1,19 @@
+import io
 import os
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
 import pandas as pd
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv, find_dotenv
 
 from SLACK import send_slack_notification
+from bulk_loader import bulk_load, bulk_swap
+from db_engine import get_engine, mysql_dsn
+from export_sink import export_frame
+from http_cache import fetch, mark_loaded
+from stage_metrics import stage
 
 # 1. Setup Logging to both Console and File
 log_filename = "pipeline.log"
@@ -13,7 +21,7 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(log_filename, mode='w'), # 'w' replaces the file every run
+        logging.FileHandler(log_filename, mode='a'), # 'a' keeps earlier runs for comparison
         logging.StreamHandler(sys.stdout)           # Still shows in GCP Logs Explorer
     ]
 )
@@ -21,14 +29,16 @@ logger = logging.getLogger(__name__)
 
 # MySQL credentials
 load_dotenv(find_dotenv())
-user = os.getenv("DB_USER")
-pw = os.getenv("DB_PASS")
-host = os.getenv("DB_HOST")
-port = os.getenv("DB_PORT")
-db = os.getenv("DB_NAME")
-
-DB_CONN = f"mysql+pymysql://{user}:{pw}@{host}:{port}/{db}?charset=utf8mb4"
-URL = "http://universities.hipolabs.com/search?country=Canada"
+DB_CONN = mysql_dsn()
+SEARCH_URL = "http://universities.hipolabs.com/search"
+# Comma-separated countries, harvested as one concurrent request per country (each cached
+# separately), or "all" for the whole worldwide list in one request: the API has no
+# country index to shard on, so the shards have to be named.
+RANKING_COUNTRIES = os.getenv("RANKING_COUNTRIES", "Canada")
+RANKING_WORKERS = int(os.getenv("RANKING_WORKERS", "8"))
+# RANKING_NORMALIZE=1 also loads university + university_domain / university_website child tables
+RANKING_NORMALIZE = os.getenv("RANKING_NORMALIZE", "0") == "1"
+LIST_SEPARATOR = ", "
 
 
 def _safe_slack_notify(message: str) -> None:
@@ -39,42 +49,120 @@ def _safe_slack_notify(message: str) -> None:
         logger.warning(f"Slack notification failed (pipeline continues): {slack_err}")
 
 
-def run_ranking_pipeline():
+def _shard_urls(countries):
+    names = [c.strip() for c in countries.split(",") if c.strip()]
+    if not names or [n.lower() for n in names] == ["all"]:
+        return [SEARCH_URL]
+    return [f"{SEARCH_URL}?{urlencode({'country': name})}" for name in names]
+
+
+def harvest(countries=None, workers=None):
+    """
+    Fetch every shard concurrently through the HTTP cache. Returns (payloads, frame); the frame is
+    None when no shard changed since the last successful load.
+    """
+    urls = _shard_urls(countries or RANKING_COUNTRIES)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers or RANKING_WORKERS, len(urls)))) as pool:
+        payloads = list(pool.map(fetch, urls))
+    if not any(p.changed for p in payloads):
+        return payloads, None
+    frames = [pd.read_json(io.BytesIO(p.content)) for p in payloads]
+    df = pd.concat([f for f in frames if not f.empty] or frames, ignore_index=True)
+    # overlapping shards (or a country listed twice) must not load a university twice
+    return payloads, df.drop_duplicates(subset=["name", "country"], ignore_index=True)
+
+
+def join_lists(values, separator=LIST_SEPARATOR):
+    """Vectorized ', '.join for a column of lists: one explode and a grouped string join."""
+    items = values.explode().dropna()
+    joined = items.astype(str).groupby(level=0).agg(separator.join).reindex(values.index)
+    joined[values.str.len().eq(0)] = ""  # an empty list joins to "", like str.join
+    return joined
+
+
+def normalize(df):
+    """
+    Split the harvested frame into a university table with an integer univ_id and one row per
+    (univ_id, domain) / (univ_id, website). Ids follow (country, name) order, so an unchanged
+    source gets the same ids on every load.
+    """
+    universities = df.sort_values(["country", "name"], kind="stable").reset_index(drop=True)
+    universities.insert(0, "univ_id", universities.index + 1)
+
+    def child(column, name):
+        items = universities.set_index("univ_id")[column].explode().dropna()
+        return items.rename(name).reset_index().drop_duplicates(ignore_index=True)
+
+    domains = child("domains", "domain")
+    websites = child("web_pages", "website")
+    universities = universities.reindex(columns=["univ_id", "name", "state-province", "country", "alpha_two_code"])
+    universities.columns = ["univ_id", "univ_name", "province", "country", "country_code"]
+    return universities, domains, websites
+
+
+def _load_normalized(df, engine):
+    universities, domains, websites = normalize(df)
+    # univ_id follows the sort order and shifts when the source changes, so the three tables
+    # are swapped in together: readers never join new university ids against old child rows
+    stats = bulk_swap(
+        {"university": universities, "university_domain": domains, "university_website": websites},
+        engine,
+        indexes={
+            "university": {"ix_university_univ_id": ["univ_id"], "ix_university_country": ["country"]},
+            "university_domain": {"ix_university_domain_univ_id": ["univ_id"],
+                                  "ix_university_domain_domain": ["domain"]},
+            "university_website": {"ix_university_website_univ_id": ["univ_id"]},
+        },
+    )
+    return stats["rows"]
+
+
+def run_ranking_pipeline(countries=None, normalized=None):
     # Log the start of the university ranking pipeline process.
     logger.info("🎓 Starting University Ranking Pipeline...")
     
+    countries = countries or RANKING_COUNTRIES
+    normalized = RANKING_NORMALIZE if normalized is None else normalized
     try:
         # 1. Extract
-        logger.info(f"Downloading data from {URL}...")
-        df = pd.read_json(URL)
+        logger.info(f"Downloading universities for: {countries}...")
+        with stage("ranking", "extract") as s:
+            payloads, raw = harvest(countries)
+            if raw is None:
+                logger.info("⏭️ Source unchanged since the last load; skipping transform and load.")
+                s.rows = 0
+                return
+            s.rows = len(raw)
         
         # 2. Transform
-        df = df[['name', 'state-province', 'domains',  'country','web_pages']]
-        df['domains'] = df['domains'].apply(lambda x: ', '.join(x) if isinstance(x, list) else x)
-        df['web_pages'] = df['web_pages'].apply(lambda x: ', '.join(x) if isinstance(x, list) else x)
-        df.columns = ['univ_name', 'province', 'domain',  'country', 'website']
+        with stage("ranking", "transform", rows=len(raw)):
+            df = raw[['name', 'state-province', 'domains',  'country','web_pages']].copy()
+            df['domains'] = join_lists(df['domains'])
+            df['web_pages'] = join_lists(df['web_pages'])
+            df.columns = ['univ_name', 'province', 'domain',  'country', 'website']
         
         # 3. Handle Export Paths & Directories
         # Fallback to current directory if EXPORT_PATH secret isn't provided
         base_path = os.getenv("EXPORT_PATH", ".")
-        
-        # FIX: Appending 'exports' to your base path dynamically
-        csv_filename = os.path.join(base_path, "university_rankings.csv")
-
-        # FIX: Ensure the target directory structure exists on the GitHub Runner
-        os.makedirs(base_path, exist_ok=True)
 
-        # Save CSV
-        df.to_csv(csv_filename, index=False)
-        logger.info(f"💾 CSV saved successfully at: {csv_filename}")
+        # Save export (Parquet by default, partitioned by run date; directories are created as needed)
+        with stage("ranking", "export", rows=len(df)):
+            export_path = export_frame(df, "university_rankings", base_path=base_path)
+        logger.info(f"💾 Export saved successfully at: {export_path}")
         
         # 4. Load to MySQL
-        engine = create_engine(DB_CONN)
-        with engine.begin() as conn:
-            conn.execute(text("DROP TABLE IF EXISTS raw_university_data"))
-        df.to_sql('raw_university_data', engine, if_exists='append', index=False)
+        with stage("ranking", "load", rows=len(df)):
+            engine = get_engine(DB_CONN)
+            # shadow table + atomic RENAME TABLE swap: zero read downtime, failed loads leave the old table
+            stats = bulk_load(df, 'raw_university_data', engine, if_exists='swap',
+                              indexes={'ix_raw_university_data_country': ['country']})
+        if normalized:
+            with stage("ranking", "load_normalized") as s:
+                s.rows = _load_normalized(raw, engine)
         
-        logger.info(f"✅ Success! Loaded {df.shape[0]} universities into MySQL.")
+        logger.info(f"✅ Success! Loaded {df.shape[0]} universities into MySQL ({stats['rows_per_sec']} rows/sec).")
+        for payload in payloads:
+            mark_loaded(payload)
    
         _safe_slack_notify(f"✅ University Ranking Pipeline Success: Loaded {len(df)} universities into MySQL.")
 
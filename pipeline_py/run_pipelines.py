@@ -0,0 +1,124 @@
+# run_pipelines.py
+# Runs every pipeline in ONE Python process instead of one interpreter per script.
+# Pipelines form a small dependency graph; anything whose dependencies are done runs
+# concurrently on a thread pool, so the nightly run takes about as long as the
+# longest chain instead of the sum of all scripts. pandas/SQLAlchemy are imported once
+# and the pooled engines from db_engine.py are shared by every pipeline.
+#
+# Usage:
+#   python pipeline_py/run_pipelines.py                 # everything
+#   python pipeline_py/run_pipelines.py titanic audit   # a subset (dependencies are not added)
+import argparse
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from SLACK import flush_notifications
+from db_engine import dispose_all
+
+RUNNER_WORKERS = int(os.getenv("RUNNER_WORKERS", "4"))
+
+
+# name -> (module, function, dependencies)
+# titanic and ranking load independent sources and start right away. The payment audit runs
+# after the dedup stage on the payment data: its report then follows the duplicate export,
+# and the two full scans of the sakila payment tables do not compete for the same server.
+# The nightly run therefore takes about max(titanic, ranking, duplicates + audit).
+PIPELINES = {
+    "titanic": ("titanic_pipeline", "run_titanic_pipeline", []),
+    "ranking": ("ranking_pipeline", "run_ranking_pipeline", []),
+    "duplicates": ("dup_pipelines", "find_all_duplicates", []),
+    "audit": ("auditor", "main", ["duplicates"]),
+}
+
+
+def _resolve(name):
+    module, func, _ = PIPELINES[name]
+    return getattr(importlib.import_module(module), func)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    try:
+        func()
+        return "success", time.perf_counter() - start, None
+    except Exception as e:
+        return "failed", time.perf_counter() - start, e
+
+
+def run_pipelines(names=None, workers=RUNNER_WORKERS):
+    """
+    Run the selected pipelines (default: all) respecting PIPELINES dependencies.
+    Returns {name: {"status", "seconds", "error"}}; a pipeline whose dependency
+    failed is reported as "skipped".
+    """
+    names = list(names or PIPELINES)
+    unknown = [n for n in names if n not in PIPELINES]
+    if unknown:
+        raise ValueError(f"Unknown pipeline(s): {', '.join(unknown)}")
+    deps = {n: [d for d in PIPELINES[n][2] if d in names] for n in names}
+
+    # import every module up front, on the main thread, so workers never race on imports
+    funcs = {n: _resolve(n) for n in names}
+    results = {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        running = {}
+        pending = set(names)
+        while pending or running:
+            for name in sorted(pending):
+                if any(results.get(d, {}).get("status") in ("failed", "skipped") for d in deps[name]):
+                    results[name] = {"status": "skipped", "seconds": 0.0, "error": None}
+                    pending.discard(name)
+                elif all(results.get(d, {}).get("status") == "success" for d in deps[name]):
+                    print(f"▶️ Starting {name}...")
+                    running[pool.submit(_timed, funcs[name])] = name
+                    pending.discard(name)
+            if not running:
+                # nothing runnable left: a dependency cycle or a dependency outside the graph
+                for name in pending:
+                    results[name] = {"status": "skipped", "seconds": 0.0, "error": None}
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status, seconds, error = future.result()
+                results[name] = {"status": status, "seconds": seconds, "error": error}
+                print(f"{'✅' if status == 'success' else '❌'} {name} {status} in {seconds:.1f}s")
+
+    total = time.perf_counter() - start
+    print("-" * 50)
+    print(f"{'pipeline':<14}{'status':<10}{'seconds':>10}")
+    for name in names:
+        r = results[name]
+        print(f"{name:<14}{r['status']:<10}{r['seconds']:>10.1f}")
+    print(f"{'total wall time':<24}{total:>10.1f}")
+    print("-" * 50)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the data pipelines in one process.")
+    parser.add_argument("pipelines", nargs="*", help=f"subset to run: {', '.join(PIPELINES)} (default: all)")
+    parser.add_argument("--workers", type=int, default=RUNNER_WORKERS, help="max pipelines running at once")
+    args = parser.parse_args()
+
+    try:
+        results = run_pipelines(args.pipelines or None, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        dispose_all()
+        # queued Slack alerts go out before the process exits
+        flush_notifications()
+    # non-zero exit so CI marks the run failed, like a failing script did before
+    sys.exit(0 if all(r["status"] == "success" for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
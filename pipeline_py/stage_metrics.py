@@ -0,0 +1,197 @@
+# stage_metrics.py
+# Lightweight per-stage instrumentation for the pipelines.
+#
+#   with stage("titanic", "load") as s:
+#       bulk_load(...)
+#       s.rows = len(df)
+#
+# Every stage records duration, rows, rows/sec and the process's peak RSS. Each record is
+# appended to METRICS_DIR/pipeline_metrics.jsonl (the run-over-run history) and the latest
+# values per pipeline/stage are rewritten to METRICS_DIR/pipeline_metrics.prom for the
+# node_exporter textfile collector. Metrics never fail a pipeline: write errors are printed.
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: peak working set through the Win32 API instead
+    resource = None
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# "or": an empty METRICS_DIR= (e.g. copied from env.example) still means the default
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(os.getenv("EXPORT_PATH") or ".", "metrics")
+
+RUN_ID = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+_lock = threading.Lock()
+
+
+def _windows_peak_working_set():
+    """PeakWorkingSetSize from GetProcessMemoryInfo (psapi), in bytes; no extra dependency needed."""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+            )
+        ]
+
+    kernel32, psapi = ctypes.WinDLL("kernel32"), ctypes.WinDLL("psapi")
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory in MB (None if unavailable)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)  # bytes on macOS, KB on Linux
+    if sys.platform == "win32":
+        try:
+            peak = _windows_peak_working_set()
+        except (OSError, AttributeError):
+            return None
+        return peak / (1024 * 1024) if peak is not None else None
+    return None
+
+
+class StageRecord:
+    """Handle yielded by stage(); set `rows` to the number of rows the stage moved."""
+
+    def __init__(self, pipeline, name, rows=None):
+        self.pipeline = pipeline
+        self.name = name
+        self.rows = rows
+
+    def as_dict(self, status, started_at, seconds, rss_start, rss_end):
+        return {
+            "run_id": RUN_ID,
+            "pipeline": self.pipeline,
+            "stage": self.name,
+            "status": status,
+            "started_at": started_at,
+            "seconds": round(seconds, 4),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / seconds, 1) if self.rows is not None and seconds > 0 else None,
+            "peak_rss_mb": round(rss_end, 1) if rss_end is not None else None,
+            # how far this stage pushed the process high-water mark
+            "peak_rss_growth_mb": round(rss_end - rss_start, 1) if rss_end is not None else None,
+        }
+
+
+@contextmanager
+def stage(pipeline, name, rows=None):
+    """Time one pipeline stage; the record is emitted even when the stage raises."""
+    record = StageRecord(pipeline, name, rows)
+    started_at = datetime.now().isoformat(timespec="seconds")
+    rss_start = peak_rss_mb()
+    start = time.perf_counter()
+    status = "failed"
+    try:
+        yield record
+        status = "success"
+    finally:
+        emit(record.as_dict(status, started_at, time.perf_counter() - start, rss_start, peak_rss_mb()))
+
+
+def instrumented(pipeline, name=None):
+    """Decorator form of stage(); a returned dict with a "rows" key fills in the row count."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(pipeline, name or func.__name__) as record:
+                result = func(*args, **kwargs)
+                if isinstance(result, dict) and "rows" in result:
+                    record.rows = result["rows"]
+                return result
+        return wrapper
+    return decorate
+
+
+def _prom_labels(entry):
+    return f'pipeline="{entry["pipeline"]}",stage="{entry["stage"]}"'
+
+
+def _write_prom(state, path):
+    lines = []
+
+    def metric(name, kind, help_text, rows):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(rows)
+
+    latest = sorted(state["latest"].values(), key=lambda e: (e["pipeline"], e["stage"]))
+    metric("pipeline_stage_duration_seconds", "gauge", "Duration of the last run of the stage.",
+           [f"pipeline_stage_duration_seconds{{{_prom_labels(e)}}} {e['seconds']}" for e in latest])
+    metric("pipeline_stage_rows", "gauge", "Rows moved by the last run of the stage.",
+           [f"pipeline_stage_rows{{{_prom_labels(e)}}} {e['rows']}" for e in latest if e["rows"] is not None])
+    metric("pipeline_stage_rows_per_second", "gauge", "Throughput of the last run of the stage.",
+           [f"pipeline_stage_rows_per_second{{{_prom_labels(e)}}} {e['rows_per_sec']}"
+            for e in latest if e["rows_per_sec"] is not None])
+    metric("pipeline_stage_peak_rss_bytes", "gauge", "Process peak RSS at the end of the stage.",
+           [f"pipeline_stage_peak_rss_bytes{{{_prom_labels(e)}}} {int(e['peak_rss_mb'] * 1024 * 1024)}"
+            for e in latest if e["peak_rss_mb"] is not None])
+    metric("pipeline_stage_last_success_timestamp_seconds", "gauge", "Unix time of the last successful run.",
+           [f"pipeline_stage_last_success_timestamp_seconds{{{_prom_labels(e)}}} {e['last_success']}"
+            for e in latest if e.get("last_success")])
+    metric("pipeline_stage_runs_total", "counter", "Stage runs by status.",
+           [f'pipeline_stage_runs_total{{{_prom_labels(e)},status="{status}"}} {count}'
+            for e in latest for status, count in sorted(e["runs"].items())])
+    metric("pipeline_stage_duration_seconds_total", "counter", "Cumulative seconds spent in the stage.",
+           [f"pipeline_stage_duration_seconds_total{{{_prom_labels(e)}}} {round(e['seconds_total'], 4)}"
+            for e in latest])
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def emit(entry, metrics_dir=None):
+    """Append `entry` to the JSON-lines history and refresh the Prometheus textfile."""
+    if not METRICS_ENABLED:
+        return
+    metrics_dir = metrics_dir or METRICS_DIR
+    state_path = os.path.join(metrics_dir, "pipeline_metrics_state.json")
+    try:
+        with _lock:
+            os.makedirs(metrics_dir, exist_ok=True)
+            with open(os.path.join(metrics_dir, "pipeline_metrics.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+            # running totals and the latest values per stage, so the .prom file never rescans the history
+            state = {"latest": {}}
+            if os.path.exists(state_path):
+                with open(state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            key = f"{entry['pipeline']}/{entry['stage']}"
+            previous = state["latest"].get(key, {"runs": {}, "seconds_total": 0.0})
+            runs = dict(previous["runs"])
+            runs[entry["status"]] = runs.get(entry["status"], 0) + 1
+            state["latest"][key] = {
+                **entry,
+                "runs": runs,
+                "seconds_total": previous["seconds_total"] + entry["seconds"],
+                "last_success": int(time.time()) if entry["status"] == "success" else previous.get("last_success"),
+            }
+            tmp = f"{state_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, state_path)
+            _write_prom(state, os.path.join(metrics_dir, "pipeline_metrics.prom"))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not write stage metrics: {e}")
@@ -1,52 +1,56 @@
-import os
+import io
 import pandas as pd
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv, find_dotenv
 from SLACK import send_slack_notification
+from bulk_loader import bulk_load
+from db_engine import get_engine, mysql_dsn
+from export_sink import export_frame
+from http_cache import fetch, mark_loaded
+from stage_metrics import stage
 
 # MySQL credentials
 load_dotenv(find_dotenv())
 
-# Fetching all components from .env
-user = os.getenv("DB_USER")
-pw = os.getenv("DB_PASS")
-host = os.getenv("DB_HOST")
-port = os.getenv("DB_PORT")
-db = os.getenv("DB_NAME")
-
-# A cleaner, more professional connection string
-DB_CONN = f"mysql+pymysql://{user}:{pw}@{host}:{port}/{db}?charset=utf8mb4"
+# Connection string built from the DB_* settings in .env (see db_engine.py)
+DB_CONN = mysql_dsn()
 URL = "https://raw.githubusercontent.com/datasciencedojo/datasets/master/titanic.csv"
 
 EXPORT_DIR = r"C:\Python\export"
-EXPORT_FILE = os.path.join(EXPORT_DIR, "raw_titanic_data.csv")
 
 
 def run_titanic_pipeline():
     print("🚢 Starting Titanic Data Flow...")
     try:
-        # 1. Extract
-        df = pd.read_csv(URL)
+        # 1. Extract (conditional GET; an unchanged CSV skips transform and load)
+        with stage("titanic", "extract") as s:
+            payload = fetch(URL)
+            if not payload.changed:
+                print("⏭️ Titanic source unchanged since the last load; skipping transform and load.")
+                s.rows = 0
+                return
+            df = pd.read_csv(io.BytesIO(payload.content))
+            s.rows = len(df)
 
         # 2. Transform (Simple cleanup)
-        df.columns = [c.lower() for c in df.columns]  # lowercase columns
+        with stage("titanic", "transform", rows=len(df)):
+            df.columns = [c.lower() for c in df.columns]  # lowercase columns
 
         # 3. Load to MySQL
-        engine = create_engine(DB_CONN)
-        with engine.begin() as conn:
-            conn.execute(text("DROP TABLE IF EXISTS raw_titanic_data"))
-        df.to_sql("raw_titanic_data", engine, if_exists="append", index=False)
+        # Typed DDL + chunked multi-row inserts into a shadow table that is swapped in
+        # with one RENAME TABLE, so readers never see a missing or half-filled table
+        with stage("titanic", "load", rows=len(df)):
+            engine = get_engine(DB_CONN)
+            bulk_load(df, "raw_titanic_data", engine, if_exists="swap",
+                      indexes={"ix_raw_titanic_data_passengerid": ["passengerid"]})
 
         # 4. Save to local export folder (overwrite if exists)
-        # Local export config
-       
-
-        os.makedirs(EXPORT_DIR, exist_ok=True)
-        df.to_csv(EXPORT_FILE, index=False)
+        with stage("titanic", "export", rows=len(df)):
+            export_path = export_frame(df, "raw_titanic_data", base_path=EXPORT_DIR)
+        mark_loaded(payload)
 
         # Task 2 success message
         print(
-            f"✅ Success! Loaded {len(df)} rows in export folder: {EXPORT_FILE} and Mysql as 'raw_titanic_data' table."
+            f"✅ Success! Loaded {len(df)} rows in export folder: {export_path} and Mysql as 'raw_titanic_data' table."
         )
        
         # Task 3 Slack success alert
@@ -63,6 +67,8 @@ def run_titanic_pipeline():
         send_slack_notification(
             f"❌ failed - Titanic pipeline failed ({error_type}): {e}"
         )
+        # re-raise after alerting so run_pipelines / CI see the failure
+        raise
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+# typed_reader.py
+# Projected, dtype-aware reads of the sakila payment tables.
+# pd.read_sql("SELECT * ...") brings every column back as int64/float64/object; the audits
+# only need two or three columns. read_typed() selects just the requested columns and
+# converts each chunk to the compact dtype declared in the table schema:
+#   "int8".."uint64"  fixed-width integers (the smallest that fits the sakila ranges)
+#   "Int32" etc.      nullable integers
+#   "decimal:N"       DECIMAL with N places held as int32 scaled by 10**N (9.99 -> 999)
+# Integer widths are a floor, not a cast: a chunk whose values do not fit the declared type
+# (e.g. customer_id 70000 in uint16) gets the smallest wider type that holds them, never wrapped.
+#   "category"        low-cardinality values
+#   "string"          Arrow-backed strings when pyarrow is installed
+#   "datetime"        datetime64
+# Columns without a declared type are returned exactly as the driver produced them.
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+PAYMENT_SCHEMA = {
+    "payment_id": "uint32",
+    "customer_id": "uint16",
+    "staff_id": "uint8",
+    "rental_id": "Int32",
+    "amount": "decimal:2",
+    "payment_date": "datetime",
+    # last_update is left as stored: the incremental audit watermark compares raw DB values
+}
+
+SCHEMAS = {"payment": PAYMENT_SCHEMA, "mypayment": PAYMENT_SCHEMA}
+
+
+def scales(schema):
+    """{column: 10**N} for every decimal:N column, i.e. what its stored integers are multiplied by."""
+    return {c: 10 ** int(t.split(":", 1)[1]) for c, t in schema.items() if t.startswith("decimal:")}
+
+
+def _fitting(kind, values):
+    """`kind`, or the smallest integer dtype at least as wide that holds every value in `values`."""
+    nullable = kind[0].isupper()
+    declared = np.dtype(kind.lower())
+    numbers = pd.to_numeric(values)
+    if numbers.notna().any():
+        lo, hi = int(numbers.min()), int(numbers.max())
+        info = np.iinfo(declared)
+        if lo < info.min or hi > info.max:
+            # keep the declared signedness unless negative values force a signed type
+            family = "u" if declared.kind == "u" and lo >= 0 else "i"
+            wider = [np.dtype(f"{family}{n}") for n in (1, 2, 4, 8) if n >= declared.itemsize]
+            fits = [t for t in wider if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max]
+            if not fits:
+                raise OverflowError(f"values {lo}..{hi} do not fit a 64-bit integer ({kind} column)")
+            declared = fits[0]
+    if not nullable:
+        return declared
+    return ("UInt" if declared.kind == "u" else "Int") + str(declared.itemsize * 8)
+
+
+def coerce(frame, schema):
+    """Convert `frame` columns in place to the compact dtypes declared in `schema`."""
+    for column, kind in schema.items():
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if kind.startswith("decimal:"):
+            scale = 10 ** int(kind.split(":", 1)[1])
+            scaled = np.rint(pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64") * scale)
+            width = _fitting("int32", pd.Series(scaled))
+            frame[column] = (pd.array(scaled, dtype=width.name.capitalize()) if np.isnan(scaled).any()
+                             else scaled.astype(width))
+        elif kind == "datetime":
+            frame[column] = pd.to_datetime(values)
+        elif kind == "string":
+            frame[column] = values.astype(STRING_DTYPE)
+        elif kind[:1] in "iIuU":
+            frame[column] = values.astype(_fitting(kind, values))
+        else:
+            frame[column] = values.astype(kind)
+    return frame
+
+
+def unscale(frame, schema):
+    """Copy of `frame` with decimal:N columns turned back into float values (for reports and exports)."""
+    factors = {c: s for c, s in scales(schema).items() if c in frame.columns}
+    if not factors:
+        return frame
+    frame = frame.copy()
+    for column, scale in factors.items():
+        frame[column] = frame[column].astype("float64") / scale
+    return frame
+
+
+def projection(conn, table, columns=None, where=None):
+    """SELECT of only `columns` (all when None) from `table`, quoted for the connection's dialect."""
+    quote = conn.dialect.identifier_preparer.quote
+    select = ", ".join(quote(c) for c in columns) if columns else "*"
+    return f"SELECT {select} FROM {quote(table)}" + (f" WHERE {where}" if where else "")
+
+
+def read_typed(conn, table, columns=None, schema=None, where=None, params=None, chunksize=None,
+               order_by=None, limit=None):
+    """
+    Read `columns` of `table` (all when None) with compact dtypes. `schema` defaults to
+    SCHEMAS[table] (no conversion for undeclared tables). With `chunksize` an iterator of
+    typed chunks is returned, like pd.read_sql. `where` / `order_by` are raw SQL fragments;
+    bind values go in `params`.
+    """
+    schema = SCHEMAS.get(table, {}) if schema is None else schema
+    query = projection(conn, table, columns, where)
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    result = pd.read_sql(text(query), conn, params=params, chunksize=chunksize)
+    if chunksize:
+        return (coerce(chunk, schema) for chunk in result)
+    return coerce(result, schema)
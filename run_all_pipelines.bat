@@ -7,9 +7,6 @@ call "C:\Python\venv\Scripts\activate"
 #call ..\venv\Scripts\activate
 
 :: 3. Run scripts from the NEW /dags subfolder
-python .\pipeline_py\titanic_pipeline.py
-python .\pipeline_py\ranking_pipeline.py
-python .\pipeline_py\auditor.py
-python .\pipeline_py\dup_pipelines.py
+python .\pipeline_py\run_pipelines.py
 
 pause
\ No newline at end of file